@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+# Compare peak memory (traced) and time of sorting a stream of tags in memory
+# and with a memory limit (sorted runs on disk).
+# Usage: python benchmarks/external_sort.py [number of tags] [memory limit MB]
+
+import random
+import sys
+import time
+import tracemalloc
+
+from pipelib.steps.container.tags import ContainerTagSort
+from pipelib.steps.sort.basic import BasicSort
+
+
+def generate(count):
+    random.seed(42)
+    for _ in range(count):
+        parts = [str(random.randint(0, 30)) for _ in range(random.randint(1, 4))]
+        yield random.choice(["", "v"]) + ".".join(parts)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    memory_limit = int(float(sys.argv[2]) * 1024**2) if len(sys.argv) > 2 else 2**24
+
+    print(f"{'step':<32} {'peak (MB)':>10} {'time (s)':>9}")
+    for name, step in [
+        ("BasicSort", BasicSort()),
+        ("BasicSort memory_limit", BasicSort(memory_limit=memory_limit)),
+        ("ContainerTagSort", ContainerTagSort()),
+        ("ContainerTagSort memory_limit", ContainerTagSort(memory_limit=memory_limit)),
+    ]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        total = sum(1 for _ in step.stream(generate(count)))
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+        print(f"{name:<32} {peak:>10.1f} {seconds:>9.2f}  ({total} results)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# Compare peak memory (traced) and time of running a pipeline over a file of
+# tags read into a list, and with run_file (memory mapped, in chunks).
+# Usage: python benchmarks/files.py [number of tags]
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pipelib.pipeline as pipeline
+import pipelib.steps as step
+
+
+def generate(filename, count):
+    random.seed(42)
+    with open(filename, "w") as fd:
+        for _ in range(count):
+            parts = [str(random.randint(0, 30)) for _ in range(random.randint(1, 4))]
+            fd.write(random.choice(["", "v"]) + ".".join(parts) + "-linux-amd64\n")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    filename = os.path.join(tempfile.mkdtemp(), "tags.txt")
+    generate(filename, count)
+    p = pipeline.Pipeline(
+        (
+            step.filters.HasPatterns(filters=["v1", "v2"]),
+            step.transform.SplitAndJoinN(split_by="-", join_by="", split_n=1),
+            step.container.ContainerTagSort(unique_minor=True),
+        )
+    )
+
+    def read_list():
+        with open(filename) as fd:
+            return p.run(fd.read().splitlines())
+
+    print(f"{'read':<12} {'peak (MB)':>10} {'time (s)':>9}")
+    for name, func in [("list", read_list), ("run_file", lambda: p.run_file(filename))]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+        print(f"{name:<12} {peak:>10.1f} {seconds:>9.2f}  ({len(result)} results)")
+    os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
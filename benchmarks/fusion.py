@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Compare a pipeline run with a compiled (fused) pipeline run.
+# Usage: python benchmarks/fusion.py [number of items]
+
+import random
+import sys
+import time
+
+import pipelib.pipeline as pipeline
+import pipelib.pipelines as pipelines
+import pipelib.steps as step
+
+
+# Steps with only a _run (no _run_batch) are fused into one generated loop
+class HasDash(step.step.BooleanStep):
+    def _run(self, item, **kwargs):
+        return "--" in item
+
+
+class StripHash(step.step.Step):
+    def _run(self, item, **kwargs):
+        return item.split("--", 1)[0]
+
+
+class Reverse(step.step.Step):
+    def _run(self, item, **kwargs):
+        return item[::-1]
+
+
+def generate(count):
+    random.seed(42)
+    return [
+        "%s.%s.%s--h%07x_%s"
+        % (
+            random.randint(0, 3),
+            random.randint(0, 20),
+            random.randint(0, 40),
+            random.getrandbits(28),
+            random.randint(0, 5),
+        )
+        for _ in range(count)
+    ]
+
+
+def timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    items = generate(count)
+    steps = (
+        ~step.filters.HasPatterns(filters=["boost"]),
+        pipelines.git.RemoveCommits,
+        step.transform.ToLowercase(),
+        step.filters.CleanCommit(),
+        step.filters.HasMaxLength(length=16),
+        step.transform.SplitAndJoinN(split_by=".", join_by="-"),
+    )
+    per_item = (HasDash(), StripHash(), Reverse())
+    for name, chain in [("batched", steps), ("per-item", per_item)]:
+        p = pipeline.Pipeline(chain)
+        compiled = p.compile()
+
+        run, expected = timeit(p.run, items)
+        fused, result = timeit(compiled.run, items)
+        # A worker of run(items, workers=N) for a chunk of (here, all) items
+        chunk, _ = timeit(pipeline.run_chunk, p.steps, items, provenance="none")
+        assert result == expected
+        print(f"{len(chain)} {name} steps, {count} items")
+        print(f"run       {run:.3f}")
+        print(f"compiled  {fused:.3f}")
+        print(f"run_chunk {chunk:.3f}")
+
+
+if __name__ == "__main__":
+    main()
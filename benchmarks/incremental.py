@@ -0,0 +1,51 @@
+# Compare a full run of a pipeline to an incremental update with a few new tags
+#   python benchmarks/incremental.py
+
+import random
+import time
+
+import pipelib.pipeline as pipeline
+import pipelib.pipelines as pipelines
+import pipelib.steps as step
+
+
+def get_tag():
+    return "%s.%s.%s%s" % (
+        random.randint(0, 20),
+        random.randint(0, 50),
+        random.randint(0, 100),
+        random.choice(["", "-alpha", "-rc1"]),
+    )
+
+
+def main(count=100000, changes=20):
+    random.seed(0)
+    items = [get_tag() for _ in range(count)]
+    p = pipeline.Pipeline(
+        (
+            pipelines.git.RemoveCommits,
+            step.transform.ToLowercase(),
+            step.container.ContainerTagSort(unique_minor=True),
+        )
+    )
+    inc = p.incremental()
+    inc.update(added=items)
+
+    added = [get_tag() for _ in range(changes)]
+    removed = random.sample(items, changes)
+    items = [x for x in items if x not in removed] + added
+
+    start = time.time()
+    expected = p.run(items)
+    print("run: %.3fs" % (time.time() - start))
+
+    start = time.time()
+    result = inc.update(added=added, removed=removed)
+    print(
+        "update (%s added, %s removed): %.3fs" % (changes, changes, time.time() - start)
+    )
+    assert result == expected
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+# Compare answering "latest per minor" after each new tag with a VersionIndex
+# against running ContainerTagSort over the full history each time.
+# Usage: python benchmarks/index.py [number of tags] [number of new tags]
+
+import random
+import sys
+import time
+
+from pipelib.index import VersionIndex
+from pipelib.steps.container.tags import ContainerTagSort
+
+
+def generate(count):
+    random.seed(42)
+    tags = []
+    for _ in range(count):
+        parts = [str(random.randint(0, 30)) for _ in range(random.randint(1, 4))]
+        tags.append(random.choice(["", "v"]) + ".".join(parts))
+    return tags
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    new = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    tags = generate(count + new)
+    history, added = tags[:count], tags[count:]
+
+    start = time.perf_counter()
+    index = VersionIndex(history)
+    print(f"build index of {count} tags: {time.perf_counter() - start:.2f}s")
+
+    step = ContainerTagSort(unique_minor=True)
+    start = time.perf_counter()
+    for i, tag in enumerate(added):
+        step.run(history + added[: i + 1])
+    seconds = time.perf_counter() - start
+    print(f"ContainerTagSort for each of {new} new tags: {seconds:.2f}s")
+
+    start = time.perf_counter()
+    for tag in added:
+        index.add(tag)
+        index.latest_per_minor()
+    seconds = time.perf_counter() - start
+    print(f"VersionIndex for each of {new} new tags: {seconds:.4f}s")
+
+
+if __name__ == "__main__":
+    main()
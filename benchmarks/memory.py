@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+# Compare memory (peak traced) and time of a pipeline for each provenance mode.
+# Usage: python benchmarks/memory.py [number of items]
+
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+import pipelib.pipeline as pipeline
+import pipelib.steps as step
+
+
+def generate(count):
+    random.seed(42)
+    letters = string.ascii_letters + string.digits + ".-"
+    return [
+        "".join(random.choice(letters) for _ in range(random.randint(3, 20)))
+        for _ in range(count)
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    items = generate(count)
+    steps = (
+        step.filters.HasMinLength(length=5),
+        step.transform.ToLowercase(),
+        step.filters.HasMaxLength(length=16),
+    )
+    modes = ["none", "original", "full"]
+    if "provenance" not in pipeline.Pipeline.__init__.__code__.co_varnames:
+        modes = [None]
+
+    print(f"{'provenance':<12} {'peak (MB)':>10} {'time (s)':>9}")
+    for mode in modes:
+        p = pipeline.Pipeline(steps) if mode is None else pipeline.Pipeline(steps, mode)
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = p.run(items, unwrap=False)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+        del result
+        print(f"{str(mode):<12} {peak:>10.1f} {seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
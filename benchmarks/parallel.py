@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# Compare a serial run with runs using a pool of workers, for cheap (built-in)
+# and expensive (custom) per-item steps, and measure what workers cost: the
+# time to pickle items to (and results from) workers, and the overhead of
+# each chunk for different chunk sizes.
+# Usage: python benchmarks/parallel.py [number of items]
+
+import concurrent.futures
+import functools
+import hashlib
+import os
+import pickle
+import random
+import sys
+import time
+
+import pipelib.pipeline as pipeline
+import pipelib.pipelines as pipelines
+import pipelib.steps as step
+
+
+class Digest(step.step.Step):
+    """
+    An expensive transform (e.g., parsing or hashing each item).
+    """
+
+    def _run(self, item, **kwargs):
+        value = item.encode("utf-8")
+        for _ in range(200):
+            value = hashlib.sha256(value).digest()
+        return "%s@%s" % (item, value.hex()[:8])
+
+
+def generate(count):
+    random.seed(42)
+    return [
+        "%s.%s.%s--h%07x_%s"
+        % (
+            random.randint(0, 3),
+            random.randint(0, 20),
+            random.randint(0, 40),
+            random.getrandbits(28),
+            random.randint(0, 5),
+        )
+        for _ in range(count)
+    ]
+
+
+def timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+    items = generate(count)
+    cheap = pipeline.Pipeline(
+        (
+            pipelines.git.RemoveCommits,
+            step.transform.ToLowercase(),
+            step.filters.CleanCommit(),
+            step.transform.SplitAndJoinN(split_by=".", join_by="-"),
+        )
+    )
+    expensive = pipeline.Pipeline((step.transform.ToLowercase(), Digest()))
+    print(f"{os.cpu_count()} CPUs, {count} items")
+
+    # What a worker costs: pickling a chunk and its results
+    result = cheap.run(items, unwrap=False)
+    pickled, _ = timeit(lambda: pickle.loads(pickle.dumps(items)))
+    returned, _ = timeit(lambda: pickle.loads(pickle.dumps(result)))
+    print(f"pickle items {pickled:.3f}  results {returned:.3f}")
+
+    for name, p, n in [("cheap", cheap, count), ("expensive", expensive, count // 20)]:
+        subset = items[:n]
+        serial, expected = timeit(p.run, subset)
+        print(f"{name} steps, {n} items: serial {serial:.3f}")
+        for workers in [2, 4]:
+            seconds, result = timeit(p.run, subset, workers=workers)
+            assert result == expected
+            print(f"  workers={workers} {seconds:.3f} ({serial / seconds:.2f}x)")
+
+    # The overhead of a chunk, with work (the cheap steps) that is the same
+    # for each size: smaller chunks pay the cost of a task more often
+    run = functools.partial(pipeline.run_chunk, cheap.steps, provenance="none")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as pool:
+        list(pool.map(run, [items[:10]] * 4))
+        for size in [100, 1000, 5000, 20000, 100000]:
+            chunks = [items[i : i + size] for i in range(0, count, size)]
+            seconds, _ = timeit(lambda: list(pool.map(run, chunks)))
+            per_chunk = seconds / len(chunks) * 1000
+            print(f"chunk_size={size:<6} {seconds:.3f} ({per_chunk:.2f} ms/chunk)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+# Compare HasPatterns (combined patterns) to searching for each pattern in turn,
+# as the number of patterns (e.g., a deny-list) grows.
+# Usage: python benchmarks/patterns.py [number of items]
+
+import random
+import re
+import string
+import sys
+import time
+
+import pipelib.steps as step
+
+
+def generate(count, size=12):
+    letters = string.ascii_lowercase + string.digits + ".-"
+    return ["".join(random.choice(letters) for _ in range(size)) for _ in range(count)]
+
+
+def search_each(items, filters):
+    return [bool(x) and any(re.search(p, x) for p in filters) for x in items]
+
+
+def timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    random.seed(42)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    items = generate(count)
+
+    print(f"{'patterns':<20} {'each':>8} {'combined':>9}")
+    for size in [1, 10, 100, 500]:
+        literals = generate(size, 5)
+        regexes = ["%s[0-9]+%s" % tuple(generate(2, 2)) for _ in range(size)]
+        for name, filters in [("literal", literals), ("regex", regexes)]:
+            s = step.filters.HasPatterns(filters=filters)
+            each = timeit(search_each, items, filters)
+            combined = timeit(s._run_batch, items, **s.kwargs)
+            assert search_each(items, filters) == s._run_batch(items, **s.kwargs)
+            print(f"{name + ' x ' + str(size):<20} {each:>8.3f} {combined:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
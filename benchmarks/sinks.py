@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+# Compare peak memory (traced) and time of writing pipeline results with
+# write_json (the full list) and with sinks (streamed, buffered writes).
+# Usage: python benchmarks/sinks.py [number of items]
+
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pipelib.pipeline as pipeline
+import pipelib.steps as step
+import pipelib.utils as utils
+
+
+def generate(count):
+    random.seed(42)
+    letters = string.ascii_letters + string.digits + ".-"
+    for _ in range(count):
+        yield "".join(random.choice(letters) for _ in range(random.randint(3, 20)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    tmpdir = tempfile.mkdtemp()
+    p = pipeline.Pipeline(step.transform.ToLowercase())
+
+    def write_json():
+        path = os.path.join(tmpdir, "results.json")
+        return utils.write_json(p.run(list(generate(count))), path)
+
+    def sink(sink_type, original=False):
+        path = os.path.join(tmpdir, "results-%s" % sink_type.__name__)
+        with sink_type(path, original=original) as sink:
+            sink.write_all(p.stream(generate(count), unwrap=not original))
+        return path
+
+    print(f"{'write':<24} {'peak (MB)':>10} {'time (s)':>9}")
+    for name, func in [
+        ("write_json", write_json),
+        ("TextSink", lambda: sink(utils.TextSink)),
+        ("JsonlSink", lambda: sink(utils.JsonlSink)),
+        ("JsonlSink original", lambda: sink(utils.JsonlSink, True)),
+        ("CsvSink original", lambda: sink(utils.CsvSink, True)),
+    ]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        path = func()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+        os.remove(path)
+        print(f"{name:<24} {peak:>10.1f} {seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
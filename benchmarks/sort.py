@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+# Compare sorting versions with rich comparisons against packed sort keys.
+# Usage: python benchmarks/sort.py [number of tags]
+
+import random
+import sys
+import time
+
+import pipelib.wrappers as wrappers
+
+
+def generate(count):
+    random.seed(42)
+    tags = []
+    for _ in range(count):
+        parts = [str(random.randint(0, 30)) for _ in range(random.randint(1, 4))]
+        tags.append(random.choice(["", "v"]) + ".".join(parts))
+    return tags
+
+
+def timeit(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    items = [wrappers.VersionWrapper(x) for x in generate(count)]
+    long_items = items + [wrappers.VersionWrapper("1.2.3.4.5")]
+
+    print(f"{'sort':<32} {'time (s)':>9}")
+    for name, values in [("packed", items), ("tuple (fallback)", long_items)]:
+        seconds, expected = timeit(lambda: sorted(values, reverse=True))
+        print(f"{'dunder ' + name:<32} {seconds:>9.2f}")
+        seconds, result = timeit(lambda: wrappers.sort_versions(values, True))
+        print(f"{'sort_versions ' + name:<32} {seconds:>9.2f}")
+        assert all(x is y for x, y in zip(result, expected))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# Compare per-item, batch, and vectorized (numpy) string steps.
+# Usage: python benchmarks/strings.py [number of items]
+
+import random
+import string
+import sys
+import time
+
+import pipelib.steps as step
+from pipelib.steps import vectorized
+
+
+def generate(count):
+    random.seed(42)
+    letters = string.ascii_letters + string.digits + ".-_"
+    return [
+        "".join(random.choice(letters) for _ in range(random.randint(3, 20)))
+        for _ in range(count)
+    ]
+
+
+def timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    items = generate(count)
+    steps = [
+        step.filters.HasMinLength(length=8),
+        step.filters.HasMaxLength(length=8),
+        step.filters.HasAllLetters(),
+        step.filters.HasAllLowerLettersNumbers(),
+        step.transform.ToLowercase(),
+        step.transform.SplitAndJoinN(split_by="-", join_by="_"),
+    ]
+    array = vectorized.as_array(items) if vectorized.numpy else None
+
+    # numpy (list) includes converting the list to an array
+    print(f"{'step':<26} {'_run':>8} {'batch':>8} {'numpy':>8} {'numpy (list)':>13}")
+    for s in steps:
+        per_item = timeit(lambda: [s._run(x, **s.kwargs) for x in items])
+        batch = timeit(s._run_batch, items, **s.kwargs)
+        numpy = converted = float("nan")
+        if array is not None:
+            numpy = timeit(s._run_batch, array, **s.kwargs)
+            vectorized.convert_lists = True
+            converted = timeit(s._run_batch, items, **s.kwargs)
+            vectorized.convert_lists = False
+        print(
+            f"{s.name:<26} {per_item:>8.3f} {batch:>8.3f} {numpy:>8.3f} {converted:>13.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
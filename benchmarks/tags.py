@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+# Compare ContainerTagSort with the Python sort and select against numpy,
+# and against asking for only the latest 5 (limit).
+# Usage: python benchmarks/tags.py [number of tags]
+
+import random
+import sys
+import time
+
+import pipelib.steps.vectorized as vectorized
+from pipelib.steps.container.tags import ContainerTagSort
+
+
+def generate(count):
+    random.seed(42)
+    tags = []
+    for _ in range(count):
+        parts = [str(random.randint(0, 30)) for _ in range(random.randint(1, 4))]
+        tags.append(random.choice(["", "v"]) + ".".join(parts))
+    return tags
+
+
+def main():
+    counts = [int(sys.argv[1])] if len(sys.argv) > 1 else [10000, 100000, 1000000]
+    print(f"{'tags':>8} {'python (s)':>11} {'numpy (s)':>10} {'limit=5 (s)':>12}")
+    for count in counts:
+        items = generate(count)
+        kwargs = {"unique_minor": True, "unique_patch": True}
+        times = []
+        results = []
+        for threshold, limit in [(None, None), (1, None), (None, 5)]:
+            vectorized.sort_threshold = threshold
+            step = ContainerTagSort(limit=limit, **kwargs)
+            best = None
+            for _ in range(3):
+                start = time.perf_counter()
+                result = step.run(items)
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            results.append(result)
+            times.append(best)
+        assert [str(x) for x in results[0]] == [str(x) for x in results[1]]
+        assert [str(x) for x in results[0][:5]] == [str(x) for x in results[2]]
+        print(f"{count:>8} {times[0]:>11.3f} {times[1]:>10.3f} {times[2]:>12.3f}")
+
+    # Three runs (patch, minor, major) against one sort for all granularities
+    vectorized.sort_threshold = None
+    print(f"\n{'tags':>8} {'3 runs (s)':>11} {'granularities (s)':>18}")
+    for count in counts:
+        items = generate(count)
+        start = time.perf_counter()
+        for granularity in ["patch", "minor", "major"]:
+            ContainerTagSort(**{"unique_" + granularity: True}).run(items)
+        separate = time.perf_counter() - start
+        start = time.perf_counter()
+        ContainerTagSort().run_granularities(items)
+        together = time.perf_counter() - start
+        print(f"{count:>8} {separate:>11.3f} {together:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import array
+import itertools
+
+import pipelib.wrappers as wrappers
+
+
+class ItemBatch:
+    """
+    A batch of items as columns: current values and the index of the original.
+
+    Filters mark rows in a selection mask instead of copying the values, and
+    transforms replace values without wrapping each one. The originals are
+    only looked up (and items wrapped) when we convert back to a list.
+    """
+
+    def __init__(self, values, originals, index=None, mask=None):
+        self.values = values
+        self.originals = originals
+        self.index = array.array("q", range(len(values))) if index is None else index
+
+        # None (all rows are selected) or a bytearray with 1 for a selected row
+        self.mask = mask
+
+    def __len__(self) -> int:
+        if self.mask is None:
+            return len(self.values)
+        return self.mask.count(1)
+
+    def __repr__(self) -> str:
+        return "ItemBatch(%s of %s)" % (len(self), len(self.values))
+
+    @classmethod
+    def from_items(cls, items: list, originals=None):
+        """
+        Create a batch from a list of (possibly wrapped) items.
+
+        If we have originals (from an earlier batch) the index refers to them,
+        and originals we haven't seen are added to a copy (the list we are
+        given, e.g., the items of a caller, is never changed).
+        """
+        if originals is None:
+            return cls(items, items)
+
+        positions = {id(x): i for i, x in enumerate(originals)}
+        index = array.array("q")
+        copied = False
+        for item in items:
+            original = wrappers.get_original(item)
+            i = positions.get(id(original))
+            if i is None:
+                if not copied:
+                    originals = list(originals)
+                    copied = True
+                i = positions[id(original)] = len(originals)
+                originals.append(original)
+            index.append(i)
+        return cls(items, originals, index)
+
+    def to_items(self, provenance="original") -> list:
+        """
+        Convert the batch to a list of items, wrapping those that have changed.
+        """
+        batch = self.compact()
+        if provenance == "none":
+            return batch.values
+
+        items = []
+        originals = batch.originals
+        for value, i in zip(batch.values, batch.index):
+            original = originals[i]
+            if value is original or isinstance(value, wrappers.Wrapper):
+                items.append(value)
+
+            # An unchanged value is the original item
+            elif type(value) is str and value == original:
+                items.append(original)
+            else:
+                items.append(
+                    wrappers.new_wrapper(value, wrappers.get_original(original))
+                )
+        return items
+
+    def compact(self):
+        """
+        Return a batch with only the selected rows (and no mask).
+        """
+        if self.mask is None:
+            return self
+        values = list(itertools.compress(self.values, self.mask))
+        index = array.array("q", itertools.compress(self.index, self.mask))
+        return ItemBatch(values, self.originals, index)
+
+    def select(self, keep: list):
+        """
+        Select the rows to keep, given a True or False for each selected row.
+        """
+        batch = self.compact()
+        return ItemBatch(batch.values, batch.originals, batch.index, bytearray(keep))
+
+    def update(self, values: list):
+        """
+        Replace the value of each selected row, and drop those that are empty.
+        """
+        batch = self.compact()
+        if all(values):
+            return ItemBatch(values, batch.originals, batch.index)
+        keep = [bool(x) for x in values]
+        return ItemBatch(
+            list(itertools.compress(values, keep)),
+            batch.originals,
+            array.array("q", itertools.compress(batch.index, keep)),
+        )
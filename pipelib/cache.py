@@ -0,0 +1,117 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import hashlib
+import json
+import os
+import threading
+
+import pipelib.utils as utils
+import pipelib.wrappers as wrappers
+from pipelib.logger import logger
+
+
+def hash_items(items, **kwargs) -> str:
+    """
+    Get a hash of the content of a list of items (and any runtime kwargs).
+    """
+    hasher = hashlib.sha256()
+    for item in items:
+        # Prefix each item with its length so that boundaries are unambiguous
+        value = str(item).encode("utf-8")
+        hasher.update(b"%d:" % len(value))
+        hasher.update(value)
+    if kwargs:
+        hasher.update(json.dumps(kwargs, sort_keys=True, default=repr).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class DiskCache:
+    """
+    Store results of pipeline runs in a directory, one file per result.
+
+    Results are saved to <root>/<fingerprint>/<input hash>.json, and when the
+    files in the cache grow larger than max_size (bytes) the least recently
+    used are removed. We keep a running total of the size of the cache, so
+    the directory is only walked (by prune) when the total is over max_size.
+    """
+
+    def __init__(self, root, max_size=1024**3):
+        self.root = os.path.abspath(root)
+        self.max_size = max_size
+        utils.mkdir_p(self.root)
+
+        # The size of the cache (None until we walk it)
+        self.size = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return "DiskCache(%s)" % self.root
+
+    def path(self, fingerprint, input_hash) -> str:
+        """
+        Get the path for a result.
+        """
+        return os.path.join(self.root, fingerprint, input_hash + ".json")
+
+    def get(self, fingerprint, input_hash):
+        """
+        Get a list of (wrapped) results, or None if we don't have them.
+        """
+        path = self.path(fingerprint, input_hash)
+        try:
+            result = utils.read_json(path)
+        except (OSError, ValueError):
+            return
+
+        # Mark the result as recently used
+        os.utime(path)
+        logger.info(f"Using cached result {path}")
+        return [self._wrap(value, original) for value, original in result["items"]]
+
+    def set(self, fingerprint, input_hash, items):
+        """
+        Save a list of (wrapped) results, and prune the cache if it is too big.
+        """
+        path = self.path(fingerprint, input_hash)
+        utils.mkdir_p(os.path.dirname(path))
+        result = {"items": [[str(x), str(getattr(x, "_original", x))] for x in items]}
+        content = json.dumps(result)
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            utils.write_file_atomic(path, content)
+            if self.size is None or self.max_size is None:
+                self.prune()
+                return
+            self.size += os.path.getsize(path) - previous
+            if self.size > self.max_size:
+                self.prune()
+
+    def prune(self):
+        """
+        Remove the least recently used results until we are under max_size.
+        """
+        if self.max_size is None:
+            return
+        files = []
+        for path in utils.recursive_find(self.root, "[.]json$"):
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(x[1] for x in files)
+        for _, filesize, path in sorted(files):
+            if size <= self.max_size:
+                break
+            logger.debug(f"Removing cached result {path}")
+            os.remove(path)
+            size -= filesize
+        self.size = size
+
+    def _wrap(self, value, original):
+        """
+        Restore a result as a basic wrapper that holds the original.
+        """
+        item = wrappers.Wrapper(value)
+        item._original = original
+        return item
@@ -0,0 +1,160 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import array
+import itertools
+import typing
+
+from pipelib.batch import ItemBatch
+from pipelib.logger import logger
+from pipelib.steps.step import BaseStep, BooleanStep
+
+# The loop generated for a run of fused steps over the values of a batch. Each
+# step adds a check or transform to the body, and we stop (continue) as soon as
+# a value is dropped. We keep the index (of the original) of each value we keep.
+template = """
+def fused(values, index):
+    out = []
+    kept = []
+    append = out.append
+    keep = kept.append
+    for value, i in zip(values, index):
+%s
+        append(value)
+        keep(i)
+    return out, kept
+"""
+
+
+class FusedSteps:
+    """
+    A run of adjacent per-item steps fused to run over an ItemBatch.
+
+    Steps with a _run_batch (most filters and transforms) are run over all of
+    the values at once. Each run of other steps is fused into a single generated
+    loop, so each value is carried through all of them in one pass without
+    intermediate lists. Values are only wrapped when the batch is converted.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+
+        # Each part is a batched step, or a generated loop for a run of steps
+        self.parts = []
+        sources = []
+        for batched, run in itertools.groupby(steps, lambda x: x.is_batched):
+            if batched:
+                self.parts += list(run)
+                continue
+            source, namespace = self.generate(list(run))
+            exec(compile(source, "<pipelib.fused>", "exec"), namespace)
+            self.parts.append(namespace["fused"])
+            sources.append(source)
+        self.source = "".join(sources)
+
+    def __repr__(self) -> str:
+        names = [getattr(step, "operator_name", step.name) for step in self.steps]
+        return "Fused(%s)" % ", ".join(names)
+
+    @property
+    def kwargs(self) -> dict:
+        return {str(step): step.kwargs for step in self.steps}
+
+    def run_batch(self, batch: ItemBatch) -> ItemBatch:
+        """
+        Run the steps over a batch, and return a new batch.
+        """
+        for part in self.parts:
+            if not batch:
+                break
+            if isinstance(part, BaseStep):
+                batch = part.run_batch(batch)
+                continue
+            batch = batch.compact()
+            values, index = part(batch.values, batch.index)
+            batch = ItemBatch(values, batch.originals, array.array("q", index))
+        return batch
+
+    def generate(self, steps: list) -> typing.Tuple[str, dict]:
+        """
+        Generate the source for a loop over steps, and the namespace to run it in.
+        """
+        namespace = {}
+        body = []
+        indent = " " * 8
+        for i, step in enumerate(steps):
+            name = "step%s" % i
+
+            # A boolean step keeps (or drops) the value, and ~step drops it if True
+            if isinstance(step, BooleanStep) and step.reverse:
+                namespace[name] = (~step).compile()
+                body.append(f"{indent}if {name}(value):")
+                body.append(f"{indent}    continue")
+                continue
+
+            if isinstance(step, BooleanStep):
+                namespace[name] = step.compile()
+                body.append(f"{indent}if not {name}(value):")
+                body.append(f"{indent}    continue")
+                continue
+
+            # Any other step returns a new value, and None (or empty) drops it
+            namespace[name] = step.compile()
+            body.append(f"{indent}value = {name}(value)")
+            body.append(f"{indent}if not value:")
+            body.append(f"{indent}    continue")
+        return template % "\n".join(body), namespace
+
+
+class CompiledPipeline:
+    """
+    A compiled pipeline fuses runs of adjacent per-item steps.
+
+    Fusion stops at steps that need the entire list (e.g., a sort), and at
+    steps that can't be fused (e.g., those that run in threads or are async).
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.stages = []
+        fusable = []
+        for step in pipeline.steps:
+            if step.is_fusable:
+                fusable.append(step)
+                continue
+            if fusable:
+                self.stages.append(FusedSteps(fusable))
+                fusable = []
+            self.stages.append(step)
+        if fusable:
+            self.stages.append(FusedSteps(fusable))
+
+    def __repr__(self) -> str:
+        return "CompiledPipeline(%s)" % ", ".join(str(x) for x in self.stages)
+
+    def run(self, items, unwrap=True, **kwargs):
+        """
+        Run the compiled pipeline to parse the items.
+
+        Stages are run over an ItemBatch, and if we unwrap the original isn't
+        needed. With full provenance each value is kept, so steps run one by one.
+        """
+        items = list(self.pipeline._wrap(items))
+        provenance = self.pipeline.provenance
+        with self.pipeline._context():
+            if provenance == "full":
+                items = self.pipeline._run_steps(self.pipeline.steps, items, **kwargs)
+                return self.pipeline._unwrap(items, unwrap)
+
+            batch = ItemBatch.from_items(items)
+            for stage in self.stages:
+                if not batch:
+                    break
+                logger.info(f">> {stage} : {stage.kwargs}")
+                if isinstance(stage, FusedSteps):
+                    batch = stage.run_batch(batch)
+                else:
+                    batch = stage.run_batch(batch, **kwargs)
+            items = batch.to_items("none" if unwrap else provenance)
+        return self.pipeline._unwrap(items, unwrap)
@@ -0,0 +1,277 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import bisect
+import collections
+import os
+import pickle
+
+import pipelib.utils as utils
+import pipelib.wrappers as wrappers
+from pipelib.logger import logger
+from pipelib.steps.step import BooleanStep
+
+
+class ItemStage:
+    """
+    A run of per-item steps that remembers the result for each item.
+
+    Results are kept by item (identity) so that only new items are run.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.results = {}
+
+    def __repr__(self) -> str:
+        return "ItemStage(%s)" % ", ".join(str(x) for x in self.steps)
+
+    def __getstate__(self):
+        return {"steps": self.steps, "results": list(self.results.values())}
+
+    def __setstate__(self, state):
+        self.steps = state["steps"]
+        self.results = {id(item): (item, result) for item, result in state["results"]}
+
+    def update(self, items: list) -> list:
+        """
+        Given all current items, return the updated items that are kept.
+        """
+        new = [item for item in items if id(item) not in self.results]
+        if new:
+            logger.info(f">> {self} : {len(new)} new items")
+            for item, result in zip(new, self.apply(new)):
+                self.results[id(item)] = (item, result)
+
+        # Only remember results for items we still have
+        results = {id(item): self.results[id(item)] for item in items}
+        self.results = results
+        return [x[1] for x in results.values() if x[1] is not None]
+
+    def apply(self, items: list) -> list:
+        """
+        Run the steps over items, and return each updated item (or None).
+        """
+        results = list(items)
+        keep = list(range(len(items)))
+        for step in self.steps:
+            values = [results[i] for i in keep]
+            if step.is_batched:
+                outcomes = [x for _, batch in step._map_batches(values) for x in batch]
+            else:
+                outcomes = [x for _, x in step._map(values)]
+
+            kept = []
+            for i, value, outcome in zip(keep, values, outcomes):
+                if isinstance(step, BooleanStep):
+                    if step._keep(outcome):
+                        kept.append(i)
+                    continue
+                updated = step._update(value, outcome)
+                if updated:
+                    results[i] = updated
+                    kept.append(i)
+            keep = kept
+
+        updated = [None] * len(items)
+        for i in keep:
+            updated[i] = results[i]
+        return updated
+
+
+class BarrierStage:
+    """
+    A step that needs all items, and is only run again if they change.
+    """
+
+    def __init__(self, step):
+        self.step = step
+        self.items = []
+        self.result = []
+
+    def __repr__(self) -> str:
+        return str(self.step)
+
+    def update(self, items: list) -> list:
+        """
+        Given all current items, return the result of the step.
+        """
+        if len(items) == len(self.items) and all(
+            x is y for x, y in zip(items, self.items)
+        ):
+            return self.result
+        logger.info(f">> {self.step} : {self.step.kwargs}")
+        self.items = items
+        self.result = self.step.run(items)
+        return self.result
+
+
+class SortedStage:
+    """
+    A step that sorts (and then selects from) items, with a parse and select.
+
+    Items are parsed once and kept in a sorted list, so new items are added
+    with a binary search instead of sorting (and parsing) everything again.
+    The order matches that of the step run, where equal items keep the order
+    they were given in (newest first).
+    """
+
+    def __init__(self, step):
+        self.step = step
+
+        # Parsed items, oldest first (equal items are in reverse input order)
+        self.ordered = []
+        self.parsed = {}
+
+    def __repr__(self) -> str:
+        return str(self.step)
+
+    def __getstate__(self):
+        return {
+            "step": self.step,
+            "ordered": self.ordered,
+            "parsed": list(self.parsed.values()),
+        }
+
+    def __setstate__(self, state):
+        self.step = state["step"]
+        self.ordered = state["ordered"]
+        self.parsed = {id(item): (item, parsed) for item, parsed in state["parsed"]}
+
+    def update(self, items: list) -> list:
+        """
+        Given all current items, return the result of the step.
+        """
+        current = {id(item): item for item in items}
+        removed = [key for key in self.parsed if key not in current]
+        added = [item for key, item in current.items() if key not in self.parsed]
+        logger.info(f">> {self.step} : {len(added)} added, {len(removed)} removed")
+
+        for key in removed:
+            _, parsed = self.parsed.pop(key)
+            i = bisect.bisect_left(self.ordered, parsed)
+            while self.ordered[i] is not parsed:
+                i += 1
+            del self.ordered[i]
+
+        for item in added:
+            self.parsed[id(item)] = (item, self.step.parse(item))
+
+        # Equal items are ordered by their position in the input
+        position = None
+        for item in added:
+            parsed = self.parsed[id(item)][1]
+            lo = bisect.bisect_left(self.ordered, parsed)
+            hi = bisect.bisect_right(self.ordered, parsed, lo)
+            if lo < hi:
+                if position is None:
+                    position = {
+                        id(self.parsed[key][1]): i for i, key in enumerate(current)
+                    }
+                here = position[id(parsed)]
+                while lo < hi and position[id(self.ordered[lo])] > here:
+                    lo += 1
+            self.ordered.insert(lo, parsed)
+
+        return self.step.select(self.ordered[::-1])
+
+
+class IncrementalPipeline:
+    """
+    Run a pipeline over a list of items that changes a little at a time.
+
+    Per-item steps remember their result for each item, and barrier steps
+    keep their state, so an update with added and removed items only runs
+    steps for what changed. The result is the same as a run of the pipeline
+    over the current items (in the order they were added).
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.fingerprint = pipeline.fingerprint
+        self._items = []
+        self.stages = []
+        for is_barrier, steps in pipeline.segments():
+            if not is_barrier:
+                self.stages.append(ItemStage(steps))
+            elif hasattr(steps[0], "parse") and hasattr(steps[0], "select"):
+                self.stages.append(SortedStage(steps[0]))
+            else:
+                self.stages.append(BarrierStage(steps[0]))
+
+    def __repr__(self) -> str:
+        return "IncrementalPipeline(%s)" % ", ".join(str(x) for x in self.stages)
+
+    @property
+    def items(self) -> list:
+        """
+        The current (input) items.
+        """
+        return [str(x) for x in self._items]
+
+    def run(self, items, unwrap=True) -> list:
+        """
+        Run the pipeline over a new set of items, reusing what we can.
+
+        Items we already have are kept (so the result is in the order they
+        were first added) and only the difference is added and removed.
+        """
+        available = collections.Counter(self.items)
+        added = []
+        for item in items:
+            if available[str(item)] > 0:
+                available[str(item)] -= 1
+            else:
+                added.append(item)
+        removed = list(available.elements())
+        return self.update(added=added, removed=removed, unwrap=unwrap)
+
+    def update(self, added=None, removed=None, unwrap=True) -> list:
+        """
+        Add and remove items, and return the result for the current items.
+        """
+        if removed:
+            removed = collections.Counter(str(x) for x in removed)
+            items = []
+            for item in self._items:
+                if removed[str(item)] > 0:
+                    removed[str(item)] -= 1
+                    continue
+                items.append(item)
+            missing = [x for x, count in removed.items() if count > 0]
+            if missing:
+                logger.warning(f"Items to remove were not found: {missing}")
+            self._items = items
+
+        # Stages keep results by item, so each item must be its own wrapper
+        if added:
+            self._items = self._items + [wrappers.Wrapper(x) for x in added]
+
+        token = wrappers.provenance.set(
+            "full" if self.pipeline.provenance == "full" else "original"
+        )
+        try:
+            items = self._items
+            for stage in self.stages:
+                items = stage.update(items)
+        finally:
+            wrappers.provenance.reset(token)
+        return self.pipeline._unwrap(items, unwrap)
+
+    def save(self, path):
+        """
+        Save the state of the pipeline (steps, items, and results) to a file.
+        """
+        utils.mkdir_p(os.path.dirname(os.path.abspath(path)))
+        with open(path, "wb") as fd:
+            pickle.dump(self, fd)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the state of a pipeline saved to a file.
+        """
+        with open(path, "rb") as fd:
+            return pickle.load(fd)
@@ -0,0 +1,261 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import bisect
+import os
+
+import pipelib.utils as utils
+import pipelib.wrappers as wrappers
+
+
+def upper_bound(prefix: tuple) -> tuple:
+    """
+    Get the smallest version after all versions that start with a prefix.
+    """
+    return prefix[:-1] + (prefix[-1] + 1,)
+
+
+class VersionIndex:
+    """
+    An index of tags sorted by version, that can be updated one tag at a time.
+
+    Tags are kept in sorted lists (buckets) of up to twice bucket_size, so adding
+    or removing a tag is a binary search and an insert into one bucket. We also
+    keep the latest tag for each major and major.minor version. Equal versions
+    are ordered as a sort of the tags in the order they were added would order
+    them, so the index gives the same answers as ContainerTagSort.
+    """
+
+    bucket_size = 1000
+
+    def __init__(self, tags=None):
+        # Sorted entries (version, -added, tag) and the last entry of each
+        self._buckets = []
+        self._maxes = []
+
+        # Lookup of entries by tag (in the order tags were added)
+        self._entries = {}
+        self._added = 0
+
+        # The latest tag for each major and major.minor version
+        self.latest_major = {}
+        self.latest_minor = {}
+        if tags:
+            self.update(tags)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, tag) -> bool:
+        return str(tag) in self._entries
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            for entry in bucket:
+                yield entry[2]
+
+    def __repr__(self) -> str:
+        return "VersionIndex(%s tags)" % len(self)
+
+    def versions(self, reverse=False) -> list:
+        """
+        Get all tags (as VersionWrapper) sorted by version.
+        """
+        tags = list(self)
+        if reverse:
+            tags.reverse()
+        return tags
+
+    def update(self, tags):
+        """
+        Add many tags. For an empty index we sort them all at once.
+        """
+        if self._entries:
+            for tag in tags:
+                self.add(tag)
+            return
+
+        entries = []
+        for tag in tags:
+            tag = str(tag)
+            if tag not in self._entries:
+                self._entries[tag] = self._entry(tag)
+                entries.append(self._entries[tag])
+        entries.sort()
+        self._buckets = [
+            entries[i : i + self.bucket_size]
+            for i in range(0, len(entries), self.bucket_size)
+        ]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+
+        # Entries are sorted, so the last for each is the latest
+        for entry in entries:
+            parsed = entry[2].parsed
+            if parsed.major is not None:
+                self.latest_major[parsed.major] = entry[2]
+            if parsed.major_minor is not None:
+                self.latest_minor[parsed.major_minor] = entry[2]
+
+    def add(self, tag) -> bool:
+        """
+        Add a tag, and return False if we already have it.
+        """
+        tag = str(tag)
+        if tag in self._entries:
+            return False
+        entry = self._entries[tag] = self._entry(tag)
+        self._insert(entry)
+
+        parsed = entry[2].parsed
+        for latest, name in [
+            (self.latest_major, parsed.major),
+            (self.latest_minor, parsed.major_minor),
+        ]:
+            if name is None:
+                continue
+            current = latest.get(name)
+            if current is None or self._entries[str(current)] < entry:
+                latest[name] = entry[2]
+        return True
+
+    def remove(self, tag) -> bool:
+        """
+        Remove a tag, and return False if we don't have it.
+        """
+        entry = self._entries.pop(str(tag), None)
+        if entry is None:
+            return False
+        self._delete(entry)
+
+        parsed = entry[2].parsed
+        for latest, name, size in [
+            (self.latest_major, parsed.major, 1),
+            (self.latest_minor, parsed.major_minor, 2),
+        ]:
+            if name is None or latest.get(name) is not entry[2]:
+                continue
+            replacement = self._last_before((upper_bound(parsed.version[:size]),))
+            if replacement is not None and replacement[0][:size] == entry[0][:size]:
+                latest[name] = replacement[2]
+            else:
+                del latest[name]
+        return True
+
+    def latest(self, prefix=None):
+        """
+        Get the latest tag, or the latest that starts with a version prefix
+        (e.g., "3" for the newest under major 3, or "3.1"). None if no tags match.
+        """
+        if prefix is None:
+            return self._buckets[-1][-1][2] if self._buckets else None
+        components = wrappers.parse_version(str(prefix)).version
+        if not components:
+            return
+        entry = self._last_before((upper_bound(components),))
+        if entry is not None and entry[0][: len(components)] == components:
+            return entry[2]
+
+    def latest_per_major(self) -> list:
+        """
+        Get the latest tag for each major version, newest first.
+        """
+        return self._sorted(self.latest_major.values())
+
+    def latest_per_minor(self) -> list:
+        """
+        Get the latest tag for each major.minor version, newest first.
+        """
+        return self._sorted(self.latest_minor.values())
+
+    def between(self, minimum=None, maximum=None) -> list:
+        """
+        Get tags with a version of at least minimum and less than maximum
+        (e.g., "1.4" for all tags >= 1.4) sorted by version.
+        """
+        tags = []
+        start = (wrappers.parse_version(str(minimum)).version,) if minimum else None
+        stop = wrappers.parse_version(str(maximum)).version if maximum else None
+        i = 0 if start is None else bisect.bisect_left(self._maxes, start)
+        for bucket in self._buckets[i:]:
+            j = 0 if start is None else bisect.bisect_left(bucket, start)
+            for entry in bucket[j:]:
+                if stop is not None and entry[0] >= stop:
+                    return tags
+                tags.append(entry[2])
+            start = None
+        return tags
+
+    def save(self, path):
+        """
+        Save the tags (in the order they were added) to a file.
+        """
+        utils.mkdir_p(os.path.dirname(os.path.abspath(path)))
+        return utils.write_json({"tags": list(self._entries)}, path, print_pretty=False)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index of tags saved to a file.
+        """
+        return cls(utils.read_json(path)["tags"])
+
+    def _entry(self, tag) -> tuple:
+        """
+        Create a sortable entry for a tag. Equal versions added later sort first,
+        so the last of equal versions is the first added.
+        """
+        self._added += 1
+        version = wrappers.VersionWrapper(tag)
+        return (version.parsed.version, -self._added, version)
+
+    def _sorted(self, tags) -> list:
+        """
+        Sort tags we have, newest first.
+        """
+        return sorted(tags, key=lambda x: self._entries[str(x)], reverse=True)
+
+    def _insert(self, entry):
+        """
+        Insert an entry into its bucket, and split the bucket if it's too big.
+        """
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+            return
+        i = min(bisect.bisect_left(self._maxes, entry), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        bisect.insort(bucket, entry)
+        self._maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.bucket_size:
+            self._buckets[i : i + 1] = [
+                bucket[: self.bucket_size],
+                bucket[self.bucket_size :],
+            ]
+            self._maxes[i : i + 1] = [bucket[self.bucket_size - 1], bucket[-1]]
+
+    def _delete(self, entry):
+        """
+        Delete an entry from its bucket, and remove the bucket if it's empty.
+        """
+        i = bisect.bisect_left(self._maxes, entry)
+        bucket = self._buckets[i]
+        del bucket[bisect.bisect_left(bucket, entry)]
+        if bucket:
+            self._maxes[i] = bucket[-1]
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+
+    def _last_before(self, key):
+        """
+        Get the last entry that sorts before a key (or None).
+        """
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            return self._buckets[-1][-1] if self._buckets else None
+        j = bisect.bisect_left(self._buckets[i], key)
+        if j:
+            return self._buckets[i][j - 1]
+        if i:
+            return self._buckets[i - 1][-1]
@@ -2,8 +2,31 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import hashlib
+import json
+import math
+import os
+import typing
+
+import pipelib.cache as cache
+import pipelib.compiler as compiler
+import pipelib.incremental as incremental
+import pipelib.utils as utils
 import pipelib.wrappers as wrappers
+from pipelib.batch import ItemBatch
 from pipelib.logger import logger
+from pipelib.steps.step import BaseStep
+from pipelib.version import __version__
+
+# The smallest chunk of items to give a worker. Each chunk costs about 0.3ms
+# (to submit, and send items and results) so for cheap steps (e.g., the
+# built-in filters and transforms, about 1.5us per item) a chunk of this many
+# keeps that overhead to a few percent (see benchmarks/parallel.py).
+min_chunk_size = 5000
 
 
 class Pipeline:
@@ -11,7 +34,12 @@ class Pipeline:
     A pipeline holds or more steps to complete in a comparison process.
     """
 
-    def __init__(self, steps=None):
+    def __init__(self, steps=None, provenance="original"):
+        if provenance not in wrappers.provenance_modes:
+            logger.exit(
+                f"Provenance {provenance} is not supported, choose one of {wrappers.provenance_modes}"
+            )
+        self.provenance = provenance
         self.steps = []
         if steps and not isinstance(steps, (tuple, str)):
             steps = [steps]
@@ -41,11 +69,11 @@ class Pipeline:
         we squash the steps.
         """
         # The final thing has to be a step!
-        if "pipelib.steps" in step.__class__.__module__:
+        if isinstance(step, BaseStep):
             self._add_step(step)
 
         # Add steps from other pipelines
-        elif "pipelib.pipeline" in step.__class__.__module__:
+        elif isinstance(step, Pipeline):
             if not step.steps:
                 return
             # Add the first step, must be compatible with list
@@ -68,13 +96,153 @@ class Pipeline:
             logger.info(f"Adding step {step}")
             self.steps.append(step)
 
-    def run(self, items, unwrap=True, **kwargs):
+    @property
+    def fingerprint(self) -> str:
+        """
+        A hash of the steps (classes, kwargs, composition), the provenance, and
+        pipelib version.
+
+        Two pipelines with the same fingerprint give the same results (with the
+        same originals, e.g., those saved to a cache).
+        """
+        spec = {
+            "version": __version__,
+            "provenance": self.provenance,
+            "steps": [step.spec for step in self.steps],
+        }
+        spec = json.dumps(spec, sort_keys=True, default=repr)
+        return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+    def run(
+        self,
+        items,
+        unwrap=True,
+        workers=None,
+        executor="process",
+        cache_dir=None,
+        **kwargs,
+    ):
         """
         Run the pipeline to parse the items.
+
+        If workers > 1, runs of per-item steps are split into chunks that are
+        processed by a pool of workers (the executor), and barrier steps (e.g.,
+        a sort) run on the merged result. The order of items is preserved.
+        The executor can be "process" (default) or "thread", and a single step
+        can also be given its own pool of threads (e.g., MyStep(threads=8)).
+
+        If cache_dir is set (a directory or a cache.DiskCache) results are saved
+        there, and returned for a later run with the same pipeline fingerprint
+        and the same items.
         """
-        # Wrap items in basic wrapper
-        items = [wrappers.Wrapper(x) for x in items if not wrappers.is_wrapped(x)]
-        for step in self.steps:
+        with self._context():
+            items = self._run(items, workers, executor, cache_dir, unwrap, **kwargs)
+        return self._unwrap(items, unwrap)
+
+    def run_file(self, filename, unwrap=True, chunk_size=2**22, **kwargs):
+        """
+        Run the pipeline over the lines of a (large) text file, one item per line.
+
+        The file is memory mapped and read in chunks of lines (see LineSource).
+        Steps before the first barrier (e.g., a sort) are run for each chunk,
+        so only their results are kept, and the remaining steps are run over
+        those. If we unwrap, the results of a chunk are plain strings, and
+        otherwise only items that changed are wrapped. To also stream the
+        results, use stream(utils.LineSource(...)).
+        """
+        first = next((i for i, x in enumerate(self.steps) if x.is_barrier), None)
+        if first is None:
+            first = len(self.steps)
+        head = Pipeline(tuple(self.steps[:first]), provenance=self.provenance)
+        tail = Pipeline(tuple(self.steps[first:]), provenance=self.provenance)
+
+        items = []
+        with head._context():
+            for chunk in utils.LineSource(filename, chunk_size).chunks():
+                items += head._run(chunk, unwrap=unwrap, **kwargs)
+        return tail.run(items, unwrap=unwrap, **kwargs)
+
+    def _run(
+        self,
+        items,
+        workers=None,
+        executor="process",
+        cache_dir=None,
+        unwrap=True,
+        **kwargs,
+    ):
+        """
+        Run the pipeline (with the provenance set) and return the final items.
+
+        If we unwrap (and don't save to a cache) the original isn't needed.
+        """
+        items = list(self._wrap(items))
+        provenance = self.provenance
+        if unwrap and cache_dir is None and provenance == "original":
+            provenance = "none"
+
+        cached = None
+        if cache_dir is not None:
+            if not isinstance(cache_dir, cache.DiskCache):
+                cache_dir = cache.DiskCache(cache_dir)
+            fingerprint = self.fingerprint
+            input_hash = cache.hash_items(items, **kwargs)
+            cached = cache_dir.get(fingerprint, input_hash)
+
+        if cached is not None:
+            items = cached
+        elif workers and workers > 1:
+            items = self._run_parallel(items, workers, executor, provenance, **kwargs)
+
+        # Full provenance keeps every value, so steps wrap each item
+        elif self.provenance == "full":
+            items = self._run_steps(self.steps, items, **kwargs)
+        else:
+            items = self._run_batches(items, provenance, **kwargs)
+
+        if cache_dir is not None and cached is None:
+            cache_dir.set(fingerprint, input_hash, items)
+        return items
+
+    @contextlib.contextmanager
+    def _context(self):
+        """
+        Run steps with the provenance of this pipeline.
+        """
+        token = wrappers.provenance.set(self.provenance)
+        try:
+            yield
+        finally:
+            wrappers.provenance.reset(token)
+
+    def incremental(self, path=None):
+        """
+        Get an incremental pipeline, to update results as items change.
+
+        If a path is given and has a saved state for this pipeline (the same
+        fingerprint) it is loaded, otherwise we start with no items.
+        """
+        if path and os.path.exists(path):
+            saved = incremental.IncrementalPipeline.load(path)
+            if saved.fingerprint == self.fingerprint:
+                return saved
+            logger.warning(f"Saved state in {path} is for a different pipeline.")
+        return incremental.IncrementalPipeline(self)
+
+    def compile(self):
+        """
+        Compile the pipeline, fusing runs of adjacent per-item steps.
+
+        The compiled pipeline has the same run, and gives the same results, but
+        carries each item through a run of filters and transforms in one pass.
+        """
+        return compiler.CompiledPipeline(self)
+
+    def _run_steps(self, steps, items, **kwargs):
+        """
+        Run a list of steps in serial over a list of items.
+        """
+        for step in steps:
             if not items:
                 break
             logger.info(f">> {step} : {step.kwargs}")
@@ -82,8 +250,227 @@ class Pipeline:
             # The kwargs are runtime kwargs, those for the step should be set
             # and checked on creation of the step. No validation is done of these.
             items = step.run(items=items, **kwargs)
-        if not unwrap:
+        return items
+
+    def _run_batches(self, items, provenance="original", **kwargs):
+        """
+        Run steps in serial over an ItemBatch, converting only at the edges.
+        """
+        batch = ItemBatch.from_items(items)
+        for step in self.steps:
+            if not batch:
+                break
+            logger.info(f">> {step} : {step.kwargs}")
+            batch = step.run_batch(batch, **kwargs)
+        return batch.to_items(provenance)
+
+    def _run_parallel(
+        self, items, workers, executor="process", provenance=None, **kwargs
+    ):
+        """
+        Run per-item steps in chunks with a pool of workers.
+
+        Chunks have at least min_chunk_size items (so fewer items are run
+        here) and workers send back the values and index of their batch, which
+        are cheaper to pickle than wrapped items. We wrap them here with the
+        provenance given (by default, that of the pipeline) so "none" skips
+        wrapping results we will unwrap.
+        """
+        provenance = provenance or self.provenance
+        executors = {
+            "process": concurrent.futures.ProcessPoolExecutor,
+            "thread": concurrent.futures.ThreadPoolExecutor,
+        }
+        if executor not in executors:
+            logger.exit(f"Executor {executor} is not supported.")
+
+        with executors[executor](max_workers=workers) as pool:
+            for is_barrier, steps in self.segments():
+                if not items:
+                    break
+
+                # Barrier steps need to see the merged result
+                if is_barrier:
+                    items = self._run_steps(steps, items, **kwargs)
+                    continue
+
+                size = max(math.ceil(len(items) / (workers * 4)), min_chunk_size)
+                chunks = [items[i : i + size] for i in range(0, len(items), size)]
+                if len(chunks) == 1:
+                    items = run_chunk(steps, items, provenance)
+                    continue
+
+                # Map returns results in the order the chunks were submitted
+                logger.info(f">> {steps} : {workers} {executor} workers")
+                items = []
+                if provenance == "full":
+                    run = functools.partial(run_chunk, steps, provenance=provenance)
+                    for result in pool.map(run, chunks):
+                        items += result
+                    continue
+
+                run = functools.partial(run_chunk_batch, steps, provenance=provenance)
+                for chunk, (values, index, added) in zip(chunks, pool.map(run, chunks)):
+                    batch = ItemBatch(values, chunk + added, index)
+                    items += batch.to_items(provenance)
+        return items
+
+    def segments(self) -> typing.Iterator:
+        """
+        Group steps into runs of per-item steps, split at barrier steps.
+
+        Yields tuples of (is_barrier, steps), where a barrier is a single step.
+        """
+        segment = []
+        for step in self.steps:
+            if not step.is_barrier:
+                segment.append(step)
+                continue
+            if segment:
+                yield False, segment
+            segment = []
+            yield True, [step]
+        if segment:
+            yield False, segment
+
+    def stream(self, items: typing.Iterable, unwrap=True) -> typing.Iterator:
+        """
+        Lazily run the pipeline, yielding results as they are produced.
+
+        Items can be any iterable (e.g., a file handle or generator) and are
+        pulled through each step one at a time. Steps that need the entire
+        input (e.g., a sort) act as barriers and collect what they are given.
+        """
+        items = self._wrap(items)
+        for step in self.steps:
+            logger.info(f">> {step} : {step.kwargs}")
+            items = step.stream(items)
+
+        # Each item is pulled through the steps with the provenance set
+        context = contextvars.copy_context()
+        context.run(wrappers.provenance.set, self.provenance)
+        done = object()
+        while True:
+            item = context.run(next, items, done)
+            if item is done:
+                return
+            yield str(item) if unwrap else self._wrap_result(item)
+
+    async def arun(self, items, unwrap=True, concurrency=10) -> list:
+        """
+        Run the pipeline in an event loop, e.g., with async steps.
+
+        Items can be an async iterable or a regular iterable. Async steps can
+        have up to concurrency calls to _run in flight, and regular steps
+        work as they always do.
+        """
+        return [x async for x in self.astream(items, unwrap, concurrency)]
+
+    async def astream(self, items, unwrap=True, concurrency=10) -> typing.AsyncIterator:
+        """
+        Lazily run the pipeline in an event loop, yielding results.
+        """
+        items = self._awrap(items)
+        for step in self.steps:
+            logger.info(f">> {step} : {step.kwargs}")
+            items = step.astream(items, concurrency)
+
+        token = wrappers.provenance.set(self.provenance)
+        try:
+            async for item in items:
+                yield str(item) if unwrap else self._wrap_result(item)
+        finally:
+            # We can't reset if we are closed from another context
+            with contextlib.suppress(ValueError):
+                wrappers.provenance.reset(token)
+
+    async def _awrap(self, items) -> typing.AsyncIterator:
+        """
+        Prepare items from an async (or regular) iterable.
+        """
+        if hasattr(items, "__aiter__"):
+            async for item in items:
+                yield self._wrap_item(item)
+        else:
+            for item in self._wrap(items):
+                yield item
+
+    def _wrap(self, items: typing.Iterable) -> typing.Iterator:
+        """
+        Prepare items to run through the steps.
+        """
+        for item in items:
+            yield self._wrap_item(item)
+
+    def _wrap_item(self, item):
+        """
+        A string is its own original, so it is used as is. Anything else is
+        converted to a string (in a wrapper, to keep the original).
+        """
+        if isinstance(item, str):
+            return item
+        if self.provenance == "none":
+            return str(item)
+        return self._wrap_result(item)
+
+    def _wrap_result(self, item):
+        """
+        Wrap a result (when not unwrapping) unless provenance is off.
+
+        With full provenance an item wrapped by a step (e.g., a version) may not
+        have a history, and wrappers.get_history can be used for any item.
+        """
+        if self.provenance == "none" or wrappers.is_wrapped(item):
+            return item
+        if self.provenance == "full":
+            return wrappers.HistoryWrapper(item)
+        return wrappers.Wrapper(item)
+
+    def _unwrap(self, items, unwrap=True) -> list:
+        """
+        Return final strings (unwrap) or wrapped results.
+        """
+        if unwrap:
+            return [str(x) for x in items]
+        return [self._wrap_result(x) for x in items]
+
+
+def run_chunk(steps, items, provenance="original"):
+    """
+    Run a list of per-item steps over a chunk of items (as an ItemBatch).
+
+    This is a module level function so that it can be sent to a worker.
+    """
+    # Full provenance keeps every value, so steps wrap each item
+    if provenance == "full":
+        token = wrappers.provenance.set(provenance)
+        try:
+            for step in steps:
+                if not items:
+                    break
+                items = step.run(items)
             return items
+        finally:
+            wrappers.provenance.reset(token)
+
+    values, index, added = run_chunk_batch(steps, items, provenance)
+    return ItemBatch(values, items + added, index).to_items(provenance)
+
 
-        # Unwrap to only be final string
-        return [str(x) for x in items]
+def run_chunk_batch(steps, items, provenance="original") -> tuple:
+    """
+    Run a list of per-item steps over a chunk of items, and return the values
+    and index of the batch, and any originals added to those of the chunk.
+    These are what a worker sends back, to be converted to items.
+    """
+    token = wrappers.provenance.set(provenance)
+    try:
+        batch = ItemBatch.from_items(items)
+        for step in steps:
+            if not batch:
+                break
+            batch = step.run_batch(batch)
+        batch = batch.compact()
+        return batch.values, batch.index, batch.originals[len(items) :]
+    finally:
+        wrappers.provenance.reset(token)
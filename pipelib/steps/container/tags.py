@@ -2,8 +2,13 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
+import contextlib
+import operator
+
+import pipelib.utils as utils
 import pipelib.wrappers as wrappers
-from pipelib.steps import step
+from pipelib.logger import logger
+from pipelib.steps import step, vectorized
 
 # Container tag specific steps
 
@@ -22,19 +27,27 @@ class ContainerTagSort(step.BaseStep):
     >>> pipeline = Pipeline(ContainerTagSort(unique_major=True))
     >>> pipeline.run(["1.2.3", "1.2.1"])
     ['1.2.3']
+    >>> pipeline = Pipeline(ContainerTagSort(limit=2))
+    >>> pipeline.run(["1.2.3", "1.3.1", "1.2.1", "1.2.3"])
+    ['1.3.1', '1.2.3']
+    >>> ContainerTagSort().run_granularities(["1.2.3", "1.3.1", "1.2.1", "2.0.0"])
+    {'patch': ['2.0.0', '1.3.1', '1.2.3', '1.2.1'], 'minor': ['2.0.0', '1.3.1', '1.2.3'], 'major': ['2.0.0', '1.3.1']}
     """
 
+    consumes = produces = wrappers.VersionWrapper
     required = ["unique_patch", "unique_minor", "unique_major", "ascending"]
     defaults = {
         "unique_patch": False,
         "unique_minor": False,
         "unique_major": False,
         "ascending": False,
+        "limit": None,
+        "memory_limit": None,
     }
 
     """
     Parse container tag versions and return a filtered and sorted set.
-    This is a special step that uses a LooseVersionWrapper to ensure we
+    This is a special step that uses a VersionWrapper to ensure we
     parse out weird commits, and can return a list sorted regular or reverse,
     and also honor the user's request to keep unique patches, major, or minor
     versions. By default we return unique patches.
@@ -45,33 +58,100 @@ class ContainerTagSort(step.BaseStep):
     unique_minor (bool): only keep latest major + minor version (e.g., 9.4)
     unique_major (bool): only keep latest major version (e.g., 9)
     ascending (bool) : return ascending ordered results
+    limit (int)      : only return the latest limit results
+    memory_limit (int): sort in runs of about this many bytes on disk
     """
 
     def run(self, items: list) -> list:
         """
-        Wrap in a LooseVersion to allow sort and filter of tags.
+        Parse tags into a VersionWrapper to sort and filter them.
         """
-        unique_major = self.kwargs.get("unique_major")
-        unique_minor = self.kwargs.get("unique_minor")
-        unique_patch = self.kwargs.get("unique_patch")
-        ascending = self.kwargs.get("ascending")
-
-        # We must choose one convention, default to patch
-        if not any([unique_major, unique_minor, unique_patch]):
-            unique_patch = True
-
-        # Convert to LooseVersionWrapper
-        items = [wrappers.VersionWrapper(x) for x in items]
+        # Sort runs of tags on disk, and select from the merged stream
+        memory_limit = self.kwargs.get("memory_limit")
+        if memory_limit is not None:
+            versions = utils.external_sort(
+                (self.parse(x) for x in items),
+                key=operator.attrgetter("parsed.version"),
+                reverse=True,
+                memory_limit=memory_limit,
+            )
+            with contextlib.closing(versions):
+                return self.select(versions)
+
+        items = [self.parse(x) for x in items]
+
+        # For the latest few, we don't need to sort everything
+        if self.kwargs.get("limit") is not None:
+            return wrappers.latest_versions(items, self.select, self.kwargs["limit"])
+
+        # For many tags, sort and select the newest of each group with numpy
+        if vectorized.sort_enabled(items):
+            filtered = self._select_vectorized(items)
+            if filtered is not None:
+                return filtered
 
         # The sorting will tag a subset with "remove" that aren't sortable
         # This has latest at the top so we grab newest versions of each
-        items.sort(reverse=True)
+        items = wrappers.sort_versions(items, reverse=True)
+        return self.select(items)
+
+    def stream(self, items):
+        """
+        Yield the result. With a memory_limit, items are not collected first.
+        """
+        if self.kwargs.get("memory_limit") is None:
+            yield from super().stream(items)
+            return
+        yield from self.run(items)
+
+    def parse(self, item):
+        """
+        Convert an item to a VersionWrapper that can be sorted.
+
+        An item that is one already (e.g., from an earlier sort) is reused.
+        """
+        return self.consume(item)
+
+    def run_granularities(self, items: list, granularities=None) -> dict:
+        """
+        Parse and sort items once, and return the result for each granularity
+        (patch, minor, or major) as if we were run with unique_<granularity>.
+        """
+        granularities = granularities or ["patch", "minor", "major"]
+        for granularity in granularities:
+            if granularity not in ["patch", "minor", "major"]:
+                logger.exit(f"{granularity} is not a known granularity for {self}")
+
+        items = wrappers.sort_versions([self.parse(x) for x in items], reverse=True)
+        return {
+            granularity: self.select(
+                items,
+                unique_major=granularity == "major",
+                unique_minor=granularity == "minor",
+                unique_patch=granularity == "patch",
+            )
+            for granularity in granularities
+        }
+
+    def select(self, items: list, **kwargs) -> list:
+        """
+        Given parsed items sorted newest first, keep the latest of each.
+
+        Any kwargs (e.g., unique_minor) are used instead of the step kwargs.
+        """
+        kwargs = dict(self.kwargs, **kwargs)
+        unique_major, unique_minor, unique_patch = self._unique(kwargs)
+        ascending = kwargs.get("ascending")
+        limit = kwargs.get("limit")
 
         # Now only take the top major / minor of each
         filtered = []
         seen = set()
 
         for version in items:
+            if len(filtered) == limit:
+                break
+
             # Not able to parse, period
             if not version.version:
                 continue
@@ -111,5 +191,34 @@ class ContainerTagSort(step.BaseStep):
 
         # By default from above they are decending, greatest (newest) to least (oldest)
         if ascending:
-            filtered.sort()
+            filtered = wrappers.sort_versions(filtered)
+        return filtered
+
+    def _unique(self, kwargs=None):
+        """
+        Get the unique_major, unique_minor, and unique_patch settings.
+        """
+        kwargs = self.kwargs if kwargs is None else kwargs
+        unique_major = kwargs.get("unique_major")
+        unique_minor = kwargs.get("unique_minor")
+        unique_patch = kwargs.get("unique_patch")
+
+        # We must choose one convention, default to patch
+        if not any([unique_major, unique_minor, unique_patch]):
+            unique_patch = True
+        return unique_major, unique_minor, unique_patch
+
+    def _select_vectorized(self, items: list):
+        """
+        Sort and select parsed items with numpy, the same as sort and select.
+        """
+        levels = [n for n, unique in enumerate(self._unique(), 1) if unique]
+        keep = vectorized.select_versions([x.parsed.version for x in items], levels)
+        if keep is None:
+            return
+        filtered = [items[i] for i in keep]
+
+        # Kept versions are unique, so ascending is the reverse
+        if self.kwargs.get("ascending"):
+            filtered.reverse()
         return filtered
@@ -21,15 +21,25 @@ class CleanCommit(step.Step):
     """
 
     def _run(self, item, **kwargs):
-        if "--" in item and "_" in item:
-            start, rest = item.split("--", 1)
-            ending = rest.split("_", 1)[-1]
-
-            # '0.1.19.10'
-            item = "%s.%s" % (start, ending)
-
-        # If we get here and still have -- replace with .
-        for token in ["--", "-"]:
-            if token in item:
-                item = item.replace(token, ".")
-        return item
+        return clean_commit(item)
+
+    def _run_batch(self, items, **kwargs) -> list:
+        return [clean_commit(item) for item in items]
+
+
+def clean_commit(item):
+    """
+    Remove a commit from a container tag, and replace - with .
+    """
+    if "--" in item and "_" in item:
+        start, rest = item.split("--", 1)
+        ending = rest.split("_", 1)[-1]
+
+        # '0.1.19.10'
+        item = "%s.%s" % (start, ending)
+
+    # If we get here and still have -- replace with .
+    for token in ["--", "-"]:
+        if token in item:
+            item = item.replace(token, ".")
+    return item
@@ -2,7 +2,7 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
-from pipelib.steps import step
+from pipelib.steps import step, vectorized
 
 
 class HasMinLength(step.BooleanStep):
@@ -26,6 +26,12 @@ class HasMinLength(step.BooleanStep):
             return True
         return False
 
+    def _run_batch(self, items, **kwargs) -> list:
+        length = kwargs["length"]
+        if vectorized.enabled(items):
+            return vectorized.has_min_length(items, length)
+        return [bool(item) and len(item) >= length for item in items]
+
 
 class HasMaxLength(step.BooleanStep):
     """
@@ -47,3 +53,9 @@ class HasMaxLength(step.BooleanStep):
         if item and len(item) <= length:
             return True
         return False
+
+    def _run_batch(self, items, **kwargs) -> list:
+        length = kwargs["length"]
+        if vectorized.enabled(items):
+            return vectorized.has_max_length(items, length)
+        return [bool(item) and len(item) <= length for item in items]
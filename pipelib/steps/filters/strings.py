@@ -2,9 +2,10 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
+import functools
 import re
 
-from pipelib.steps import step
+from pipelib.steps import step, vectorized
 
 
 class HasPatterns(step.BooleanStep):
@@ -22,12 +23,26 @@ class HasPatterns(step.BooleanStep):
     required = ["filters"]
 
     def _run(self, item, **kwargs) -> list:
-        filters = kwargs.get("filters") or []
-        if item and filters:
-            for pattern in filters:
-                if re.search(pattern, item):
-                    return True
-        return False
+        if not item:
+            return False
+        return any(p.search(item) for p in self._patterns(kwargs.get("filters")))
+
+    def _run_batch(self, items, **kwargs) -> list:
+        patterns = self._patterns(kwargs.get("filters"))
+        if len(patterns) == 1:
+            search = patterns[0].search
+            return [bool(item) and search(item) is not None for item in items]
+        return [bool(item) and any(p.search(item) for p in patterns) for item in items]
+
+    def _patterns(self, filters) -> list:
+        """
+        Get the compiled patterns for a list of filters, compiling them once.
+        """
+        compiled = self.__dict__.get("_compiled")
+        if compiled is None or compiled[0] is not filters:
+            compiled = (filters, compile_patterns(tuple(filters or [])))
+            self._compiled = compiled
+        return compiled[1]
 
 
 class HasAllLetters(step.BooleanStep):
@@ -43,7 +58,14 @@ class HasAllLetters(step.BooleanStep):
     """
 
     def _run(self, item, **kwargs) -> bool:
-        return re.sub("([a-zA-Z])+", "", item) == ""
+        return item.isascii() and item.isalpha() or not item
+
+    def _run_batch(self, items, **kwargs) -> list:
+        if vectorized.enabled(items):
+            result = vectorized.has_all_letters(items)
+            if result is not None:
+                return result
+        return [x.isascii() and x.isalpha() or not x for x in items]
 
 
 class HasAllLowerLettersNumbers(step.BooleanStep):
@@ -59,4 +81,100 @@ class HasAllLowerLettersNumbers(step.BooleanStep):
     """
 
     def _run(self, item, **kwargs) -> bool:
-        return re.sub("([0-9]|[a-z])+", "", item) == ""
+        return is_lower_letters_numbers(item)
+
+    def _run_batch(self, items, **kwargs) -> list:
+        if vectorized.enabled(items):
+            result = vectorized.has_all_lower_letters_numbers(items)
+            if result is not None:
+                return result
+        return [is_lower_letters_numbers(x) for x in items]
+
+
+def is_lower_letters_numbers(item):
+    """
+    Determine if an item is only ASCII lowercase letters and numbers (or empty)
+    """
+    if not item:
+        return True
+    return item.isascii() and item.isalnum() and (item.islower() or item.isdigit())
+
+
+# Characters that make a pattern more than a literal substring
+special_characters = set(".^$*+?{}[]\\|()")
+
+# Patterns that can't be combined with others (backreferences, conditional
+# group references, and global flags)
+separate_re = re.compile(r"\\[1-9]|\(\?P=|\(\?\(|^\(\?[aiLmsux]+\)")
+
+
+@functools.lru_cache(maxsize=128)
+def compile_patterns(filters: tuple) -> list:
+    """
+    Compile a list of filters into as few regular expressions as we can.
+
+    Literal substrings are combined into one trie (so each position in an item
+    is only checked against literals that share a prefix) and other patterns
+    are combined into one alternation. An item matches if any pattern matches.
+    Compiled patterns (re.Pattern) are used as they are.
+    """
+    literals = [
+        x
+        for x in filters
+        if isinstance(x, str) and not special_characters.intersection(x)
+    ]
+    combined = []
+    separate = []
+    for pattern in filters:
+        if pattern in literals:
+            continue
+        # Compile alone first so an invalid pattern raises an error here
+        re.compile(pattern)
+        if isinstance(pattern, re.Pattern) or separate_re.search(pattern):
+            separate.append(pattern)
+        else:
+            combined.append(pattern)
+
+    parts = ["(?:%s)" % x for x in combined]
+    if literals:
+        parts.insert(0, trie_regex(literals))
+    try:
+        patterns = [re.compile("|".join(parts))] if parts else []
+    except re.error:
+        patterns = [re.compile(x) for x in parts]
+    return patterns + [re.compile(x) for x in separate]
+
+
+def trie_regex(literals: list) -> str:
+    """
+    Build a regular expression that matches any of a list of literal strings.
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for character in literal:
+            node = node.setdefault(character, {})
+        node[""] = {}
+
+    # Visit nodes parents first, without recursing (a literal can be long)
+    nodes = []
+    stack = [trie]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        # A literal ends here, so we don't need to look for longer ones
+        if "" not in node:
+            stack.extend(node.values())
+
+    # Build the expression for each node after those of its children
+    built = {}
+    for node in reversed(nodes):
+        if "" in node:
+            built[id(node)] = ""
+            continue
+        branches = [re.escape(c) + built[id(x)] for c, x in sorted(node.items())]
+        if len(branches) == 1:
+            built[id(node)] = branches[0]
+        else:
+            built[id(node)] = "(?:%s)" % "|".join(branches)
+    return built[id(trie)]
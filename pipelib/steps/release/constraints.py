@@ -0,0 +1,176 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import functools
+import re
+
+import pipelib.wrappers as wrappers
+from pipelib.logger import logger
+from pipelib.steps import step
+
+# A clause of a constraint is an operator (== if not given) and a version
+clause_re = re.compile(r"^\s*(~=|==|!=|<=|>=|<|>)?\s*v?([\d.]+?)(\.\*)?\s*$")
+
+# The smallest version with components (versions without any are never kept)
+first_version = (0,)
+
+
+class VersionRange(step.BooleanStep):
+    """
+    Keep versions that match a constraint, e.g., ">=1.2,<2.0" or "~=3.4".
+
+    >>> from pipelib.pipeline import Pipeline
+    >>> pipeline = Pipeline(VersionRange(constraint=">=1.2,<2.0"))
+    >>> pipeline.run(["1.1", "1.2", "1.10.1", "2.0.0", "latest"])
+    ['1.2', '1.10.1']
+    >>> pipeline = Pipeline(VersionRange(constraint="~=3.4,!=3.6.*"))
+    >>> pipeline.run(["v3.3", "v3.4.1", "v3.6.2", "v3.9", "v4.0"])
+    ['v3.4.1', 'v3.9']
+    >>> pipeline = Pipeline(VersionRange(constraint="<2", ordered="descending"))
+    >>> pipeline.run(["2.1", "1.9", "1.2", "0.1"])
+    ['1.9', '1.2', '0.1']
+    """
+
+    required = ["constraint"]
+    defaults = {"ordered": None}
+
+    """
+    Versions are compared by their components, as ContainerTagSort sorts them
+    (so 1.2 < 1.2.0). A constraint has clauses separated by commas:
+
+    Parameters
+    ==========
+    constraint (str): clauses like >=1.2, <2.0, ==1.2.3, ==1.2.*, !=1.3, ~=3.4
+    ordered (str)   : ascending or descending, if items are sorted by version
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        parse_constraint(self.kwargs["constraint"])
+        if self.kwargs["ordered"] not in [None, "ascending", "descending"]:
+            logger.exit(f"ordered must be ascending or descending for {self.name}")
+
+    def _run(self, item, **kwargs) -> bool:
+        return in_ranges(get_version(item), parse_constraint(kwargs["constraint"]))
+
+    def _run_batch(self, items, **kwargs) -> list:
+        ranges = parse_constraint(kwargs["constraint"])
+
+        # Items sorted by version are kept in slices found with a binary search
+        if kwargs.get("ordered") is not None:
+            keep = [False] * len(items)
+            descending = kwargs["ordered"] == "descending"
+            for start, stop in ranges:
+                i = bisect_versions(items, start, descending)
+                if stop is None:
+                    j = 0 if descending else len(items)
+                else:
+                    j = bisect_versions(items, stop, descending)
+                if descending:
+                    i, j = j, i
+                keep[i:j] = [True] * (j - i)
+            return keep
+        return [in_ranges(get_version(item), ranges) for item in items]
+
+
+def get_version(item) -> tuple:
+    """
+    Get the version components of an item (parsed if it isn't already).
+    """
+    if isinstance(item, wrappers.VersionWrapper):
+        return item.parsed.version
+    return wrappers.parse_version(str(item) if item else "").version
+
+
+def in_ranges(version: tuple, ranges: list) -> bool:
+    """
+    Determine if a version is in any range (start, stop) of versions.
+    """
+    for start, stop in ranges:
+        if start <= version and (stop is None or version < stop):
+            return True
+    return False
+
+
+def bisect_versions(items: list, version: tuple, descending=False) -> int:
+    """
+    Find the first index of sorted items that is not before a version. For
+    ascending items that is the first >= version, and for descending items
+    the first < version. Only the items we look at are parsed.
+    """
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        value = get_version(items[mid])
+        before = value >= version if descending else value < version
+        if before:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def after(version: tuple) -> tuple:
+    """
+    Get the smallest version greater than a version (components are >= 0).
+    """
+    return version + (-1,)
+
+
+def after_prefix(version: tuple) -> tuple:
+    """
+    Get the smallest version greater than all that start with a version.
+    """
+    return version[:-1] + (version[-1] + 1,)
+
+
+def intersect(ranges: list, others: list) -> list:
+    """
+    Intersect two sorted lists of ranges (start, stop), where stop None is open.
+    """
+    result = []
+    for start, stop in ranges:
+        for other_start, other_stop in others:
+            low = max(start, other_start)
+            if stop is None or other_stop is None:
+                high = stop if other_stop is None else other_stop
+            else:
+                high = min(stop, other_stop)
+            if high is None or low < high:
+                result.append((low, high))
+    return sorted(result)
+
+
+@functools.lru_cache(maxsize=128)
+def parse_constraint(constraint: str) -> list:
+    """
+    Parse a constraint into a sorted list of ranges (start, stop) of versions.
+    """
+    ranges = [(first_version, None)]
+    for clause in constraint.split(","):
+        match = clause_re.match(clause)
+        version = match and tuple(int(x) for x in match.group(2).split(".") if x)
+        if not version or (match.group(3) and match.group(1) not in [None, "==", "!="]):
+            logger.exit(f"{clause} is not a valid version constraint.")
+        op, prefix = match.group(1) or "==", match.group(3)
+        end = after_prefix(version) if prefix else after(version)
+
+        if op == "==":
+            clause_ranges = [(version, end)]
+        elif op == "!=":
+            clause_ranges = [(first_version, version), (end, None)]
+        elif op == ">=":
+            clause_ranges = [(version, None)]
+        elif op == ">":
+            clause_ranges = [(end, None)]
+        elif op == "<=":
+            clause_ranges = [(first_version, end)]
+        elif op == "<":
+            clause_ranges = [(first_version, version)]
+        elif len(version) < 2:
+            logger.exit(f"{clause} needs a major and minor version.")
+        else:
+            clause_ranges = [(version, after_prefix(version[:-1]))]
+        ranges = intersect(ranges, clause_ranges)
+    return ranges
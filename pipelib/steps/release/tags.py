@@ -18,39 +18,68 @@ class MajorTagSort(step.BaseStep):
     >>> pipeline.run(["1.2.3", "1.2.1"])
     []
     >>> pipeline = Pipeline(MajorTagSort(ascending=False))
-    >>> pipeline = Pipeline(ContainerTagSort(ascending=False))
     >>> pipeline.run(["v3", "1.2.3", "v2"])
-    ['v1', 'v3']
+    ['v3', 'v2']
     >>> pipeline = Pipeline(MajorTagSort(ascending=True))
     >>> pipeline.run(["v3", "1.2.3", "v2"])
-    ['v3', 'v1']
+    ['v2', 'v3']
+    >>> pipeline = Pipeline(MajorTagSort(limit=1))
+    >>> pipeline.run(["v3", "1.2.3", "v4", "v2"])
+    ['v4']
     """
 
+    consumes = produces = wrappers.VersionWrapper
+    defaults = {"limit": None}
+
     def run(self, items: list) -> list:
         """
-        Wrap in a LooseVersion to allow sort and filter of tags.
+        Parse tags into a VersionWrapper to sort and filter them.
         """
-        ascending = self.kwargs.get("ascending")
+        items = [self.parse(x) for x in items]
 
-        # Convert to LooseVersionWrapper
-        items = [wrappers.VersionWrapper(x) for x in items]
+        # For the latest few, we don't need to sort everything
+        if self.kwargs.get("limit") is not None:
+            return wrappers.latest_versions(items, self.select, self.kwargs["limit"])
 
         # The sorting will tag a subset with "remove" that aren't sortable
         # This has latest at the top so we grab newest versions of each
-        items.sort(reverse=True)
+        items = wrappers.sort_versions(items, reverse=True)
+        return self.select(items)
+
+    def parse(self, item):
+        """
+        Convert an item to a VersionWrapper that can be sorted.
+
+        An item that is one already (e.g., from an earlier sort) is reused.
+        """
+        return self.consume(item)
+
+    def select(self, items: list) -> list:
+        """
+        Given parsed items sorted newest first, keep those with only a major version.
+        """
+        ascending = self.kwargs.get("ascending")
+        limit = self.kwargs.get("limit")
 
         # Now only take the top major / minor of each
         filtered = []
         seen = set()
 
         for version in items:
+            if len(filtered) == limit:
+                break
+
             # Keep all that are only major versions
-            if version.major and not version.major_minor and version not in seen:
+            if (
+                version.major
+                and not version.major_minor
+                and version.parsed.version not in seen
+            ):
                 filtered.append(version)
-                seen.add(version)
+                seen.add(version.parsed.version)
                 continue
 
         # By default from above they are decending, greatest (newest) to least (oldest)
         if ascending:
-            filtered.sort()
+            filtered = wrappers.sort_versions(filtered)
         return filtered
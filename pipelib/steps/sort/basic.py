@@ -2,6 +2,9 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
+import heapq
+
+import pipelib.utils as utils
 from pipelib.steps import step
 
 # Filters take some string and return true/false if a condition passes
@@ -18,13 +21,43 @@ class BasicSort(step.Step):
     >>> pipeline = Pipeline(BasicSort(reverse=True))
     >>> pipeline.run([1, 2, 3])
     ['3', '2', '1']
+    >>> pipeline = Pipeline(BasicSort(reverse=True, limit=2))
+    >>> pipeline.run([1, 3, 2])
+    ['3', '2']
+    >>> pipeline = Pipeline(BasicSort(memory_limit=100))
+    >>> pipeline.run([3, 1, 2])
+    ['1', '2', '3']
     """
 
-    defaults = {"reverse": False}
+    defaults = {"reverse": False, "limit": None, "memory_limit": None}
+    barrier = True
 
     def run(self, items, **kwargs):
         """
         This run happens for the top level of items.
         """
         reverse = self.kwargs["reverse"]
+        limit = self.kwargs.get("limit")
+
+        # Only the first limit items are selected (with a heap)
+        if limit is not None and reverse:
+            return heapq.nlargest(limit, items)
+        if limit is not None:
+            return heapq.nsmallest(limit, items)
+        if self.kwargs.get("memory_limit") is not None:
+            return list(self.stream(items))
         return sorted(items, reverse=reverse)
+
+    def stream(self, items):
+        """
+        Yield sorted items. With a memory_limit (bytes), sorted runs of items
+        are saved to temporary files and merged, so we only hold about that
+        much of the items at once.
+        """
+        memory_limit = self.kwargs.get("memory_limit")
+        if memory_limit is None or self.kwargs.get("limit") is not None:
+            yield from super().stream(items)
+            return
+        yield from utils.external_sort(
+            items, reverse=self.kwargs["reverse"], memory_limit=memory_limit
+        )
@@ -3,11 +3,19 @@ __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
 import abc
+import asyncio
+import collections
+import concurrent.futures
 import copy
+import functools
 import inspect
+import itertools
+import operator
 import typing
 
+import pipelib.utils as utils
 import pipelib.wrappers as wrappers
+from pipelib.batch import ItemBatch
 from pipelib.logger import logger
 
 
@@ -19,7 +27,24 @@ class BaseStep:
     required = []
     defaults = {}
 
-    def __init__(self, **kwargs):
+    # A barrier step needs all items at once (e.g., to sort them)
+    barrier = True
+
+    # The largest number of items to give to _run_batch at once when streaming
+    batch_size = 1000
+
+    # The wrapper a step needs for items (an item that is one already is used
+    # as is) and the wrapper of the items it returns, so parsed state (e.g., of
+    # a VersionWrapper) flows from one step to the next
+    consumes = None
+    produces = None
+
+    def __init__(self, threads=None, cache=None, **kwargs):
+        # Optionally fan out calls to _run to a pool of threads
+        self.threads = threads
+
+        # Optionally remember results of _run for up to this many items
+        self.cache = utils.LRUCache(cache) if cache else None
         self.kwargs = self.check_kwargs(kwargs)
 
     @property
@@ -36,6 +61,199 @@ class BaseStep:
     def __repr__(self) -> str:
         return self.name
 
+    @property
+    def spec(self) -> dict:
+        """
+        Describe the step (class and kwargs) e.g., to fingerprint a pipeline.
+        """
+        cls = self.__class__
+        return {
+            "step": "%s.%s" % (cls.__module__, cls.__qualname__),
+            "kwargs": self.kwargs,
+        }
+
+    @property
+    def is_barrier(self) -> bool:
+        """
+        Determine if the step must see all items before yielding any.
+        """
+        return self.barrier
+
+    @property
+    def is_fusable(self) -> bool:
+        """
+        Determine if the step can be fused with others into one loop.
+        """
+        return (
+            hasattr(self, "compile")
+            and not self.is_barrier
+            and not self.threads
+            and self.produces is None
+        )
+
+    def consume(self, item):
+        """
+        Get an item as the wrapper the step consumes, reusing it if it is one.
+        """
+        if self.consumes is None or isinstance(item, self.consumes):
+            return item
+        return self.consumes(item)
+
+    def run_batch(self, batch: ItemBatch, **kwargs) -> ItemBatch:
+        """
+        Run the step over an ItemBatch, and return a new batch.
+
+        By default the batch is converted to a list for run, and filters and
+        transforms work on the values of the batch directly.
+        """
+        items = self.run(batch.to_items(wrappers.provenance.get()), **kwargs)
+        return ItemBatch.from_items(items, batch.originals)
+
+    def stream(self, items: typing.Iterable) -> typing.Iterator:
+        """
+        Yield results for an iterable of items. A barrier step must see all
+        items first, so we collect them and then yield from the result.
+        """
+        yield from self.run(list(items))
+
+    async def astream(
+        self, items: typing.AsyncIterable, concurrency=None
+    ) -> typing.AsyncIterator:
+        """
+        Yield results for an async iterable of items. As with stream, a
+        barrier step collects all items first.
+        """
+        for item in self.run([x async for x in items]):
+            yield item
+
+    async def _amap(
+        self, items: typing.AsyncIterable, concurrency=None
+    ) -> typing.AsyncIterator:
+        """
+        Yield tuples of (item, result of _run) for an async iterable of items.
+        A step with a synchronous _run is simply called for each item.
+        """
+        run = self._memoize(functools.partial(self._run, **self.kwargs))
+        async for item in items:
+            yield item, run(item)
+
+    @property
+    def is_batched(self) -> bool:
+        """
+        Determine if the step has a _run_batch to prefer over _run.
+
+        A subclass that overrides _run (but not _run_batch) is not batched.
+        """
+        if self.threads or not hasattr(self, "_run_batch"):
+            return False
+        for cls in type(self).__mro__:
+            if "_run_batch" in vars(cls):
+                return True
+            if "_run" in vars(cls):
+                return False
+        return False
+
+    def _map_batches(self, items: typing.Iterable) -> typing.Iterator:
+        """
+        Yield tuples of (batch of items, results of _run_batch).
+
+        A list is handled as one batch. Other iterables are read in batches
+        that start small (so the first results of a stream come quickly) and
+        grow up to the batch size.
+        """
+        if isinstance(items, list):
+            if items:
+                yield items, self._evaluate_batch(items)
+            return
+
+        items = iter(items)
+        size = 1
+        while True:
+            batch = list(itertools.islice(items, size))
+            if not batch:
+                return
+            yield batch, self._evaluate_batch(batch)
+            size = min(size * 2, self.batch_size)
+
+    def _evaluate_batch(self, items: list) -> list:
+        """
+        Run _run_batch for a batch of items, only for those not in the cache.
+        """
+        if self.cache is None:
+            return self._run_batch(items, **self.kwargs)
+
+        frozen = utils.freeze(self.kwargs)
+        keys = [(frozen, x if type(x) is str else str(x)) for x in items]
+
+        # Look up each unique item once, and only run those we don't have
+        results = []
+        todo = {}
+        for i, key in enumerate(keys):
+            if key in todo:
+                self.cache.hit()
+                todo[key].append(i)
+                result = None
+            else:
+                result = self.cache.get(key)
+                if result is self.cache.missing:
+                    todo[key] = [i]
+            results.append(result)
+
+        if todo:
+            indices = list(todo.values())
+            computed = self._run_batch([items[i[0]] for i in indices], **self.kwargs)
+            for key, index, result in zip(todo, indices, computed):
+                self.cache.set(key, result)
+                for i in index:
+                    results[i] = result
+        return results
+
+    def _memoize(self, func: typing.Callable) -> typing.Callable:
+        """
+        Given a function for one item, remember results if we have a cache.
+
+        Results are keyed on the item value and the step's (frozen) kwargs.
+        """
+        if self.cache is None:
+            return func
+        cache = self.cache
+        frozen = utils.freeze(self.kwargs)
+
+        def memoized(item):
+            key = (frozen, item if type(item) is str else str(item))
+            result = cache.get(key)
+            if result is cache.missing:
+                result = func(item)
+                cache.set(key, result)
+            return result
+
+        return memoized
+
+    def _map(self, items: typing.Iterable) -> typing.Iterator:
+        """
+        Yield tuples of (item, result of _run), in the order of the items.
+
+        If the step has threads, calls are run in a bounded pool so that
+        I/O bound steps (or those that release the GIL) can overlap.
+        """
+        run = self._memoize(functools.partial(self._run, **self.kwargs))
+        if not self.threads or self.threads < 2:
+            for item in items:
+                yield item, run(item)
+            return
+
+        # Only keep a window of pending results to stay lazy
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as pool:
+            for item in items:
+                pending.append((item, pool.submit(run, item)))
+                if len(pending) >= self.threads * 2:
+                    item, future = pending.popleft()
+                    yield item, future.result()
+            while pending:
+                item, future = pending.popleft()
+                yield item, future.result()
+
     @property
     def return_type(self) -> typing.Type:
         """
@@ -88,48 +306,105 @@ class Step(BaseStep):
     A standard step returns a new item or None (indicative to not add)
     """
 
+    barrier = False
+
+    @property
+    def is_barrier(self) -> bool:
+        """
+        A step that provides its own run (e.g., a sort) is a barrier.
+        """
+        return self.barrier or type(self).run is not Step.run
+
     def run(self, items: list, **kwargs) -> list:
         """
         Loop through items, keep items that are not None.
         """
-        keepers = []
-        for item in items:
-            # Keep the item if the outcome is True
-            updated = self._run(item, **self.kwargs)
+        return list(self.stream(items))
 
-            # A step can choose to preserve a wrappr (or not)
-            # always pass the item through a wrapper to keep the original
-            if updated and not wrappers.is_wrapped(updated):
-                updated = wrappers.Wrapper(updated)
+    def run_batch(self, batch: ItemBatch, **kwargs) -> ItemBatch:
+        """
+        Replace the values of a batch, without wrapping each one.
+        """
+        # A step that updates (wraps) items its own way needs the items
+        if not self.is_fusable or type(self)._update is not Step._update:
+            return super().run_batch(batch, **kwargs)
 
-                # We could be handed an wrapped item
-                if hasattr(item, "_original"):
-                    updated._original = item._original
+        values = batch.compact().values
+        if self.is_batched:
+            return batch.update(self._evaluate_batch(values))
+        run = self.compile()
+        return batch.update([run(x) for x in values])
 
-                # Or an uwrapped item
-                else:
-                    updated._original = item
+    def stream(self, items: typing.Iterable) -> typing.Iterator:
+        """
+        Lazily yield updated items, skipping those that are None.
+        """
+        if self.is_barrier:
+            yield from super().stream(items)
+            return
+
+        if self.is_batched:
+            for batch, results in self._map_batches(items):
+                for item, updated in zip(batch, results):
+                    updated = self._update(item, updated)
+                    if updated:
+                        yield updated
+            return
+
+        for item, updated in self._map(items):
+            updated = self._update(item, updated)
+            if updated:
+                yield updated
+
+    async def astream(
+        self, items: typing.AsyncIterable, concurrency=None
+    ) -> typing.AsyncIterator:
+        """
+        Lazily yield updated items from an async iterable.
+        """
+        if self.is_barrier:
+            async for item in super().astream(items, concurrency):
+                yield item
+            return
 
+        async for item, updated in self._amap(items, concurrency):
+            updated = self._update(item, updated)
             if updated:
-                keepers.append(updated)
-        return keepers
+                yield updated
+
+    def _update(self, item, updated):
+        """
+        Given an item and the result of _run, return the updated item.
+        """
+        # A step can choose to preserve a wrappr (or not)
+        # always pass the item through a wrapper to keep the original
+        updated = wrappers.wrap(updated, item)
+        if self.produces is None or not updated or isinstance(updated, self.produces):
+            return updated
+        return self.produces(updated)
 
     @abc.abstractmethod
     def _run(self, item: typing.Any, **kwargs) -> bool:
         raise NotImplementedError("A step must have a _run function.")
 
+    def compile(self) -> typing.Callable:
+        """
+        Return a function that takes an item and returns the updated item.
+        """
+        return self._memoize(functools.partial(self._run, **self.kwargs))
+
 
 class BooleanStep(BaseStep):
     """
     A boolean step must return true or false, and we keep the item if True.
     """
 
+    barrier = False
+
     def __init__(self, **kwargs):
         # Make sure we don't re-create anything!
         if not hasattr(self, "reverse"):
             self.reverse = False
-        if not hasattr(self, "compose"):
-            self.compose = []
         super().__init__(**kwargs)
 
     @property
@@ -141,12 +416,27 @@ class BooleanStep(BaseStep):
             return "Not" + self.name
         return self.name
 
+    @property
+    def spec(self) -> dict:
+        spec = super().spec
+        spec["reverse"] = self.reverse
+        return spec
+
     def __invert__(self):
         """
-        We can say "~step" and reverse the logic.
+        We can say "~step" and reverse the logic. This returns a new step.
+        """
+        inverted = copy.copy(self)
+        inverted.reverse = not self.reverse
+        return inverted
+
+    def __getstate__(self):
+        """
+        Compiled checks are closures, and are re-created after a pickle.
         """
-        self.reverse = True
-        return self
+        state = self.__dict__.copy()
+        state.pop("_checker", None)
+        return state
 
     def check_compatibility(self, other):
         """
@@ -182,64 +472,51 @@ class BooleanStep(BaseStep):
 
         # The classes must be the same type
         self.check_compatibility(other)
+        if isinstance(self, AsyncMixin) or isinstance(other, AsyncMixin):
+            logger.exit(f"{self} and {other} are async and cannot be combined.")
+
+        # Flatten steps that already use the same operator (a & b & c)
+        steps = []
+        for step in [self, other]:
+            if (
+                isinstance(step, ComposedStep)
+                and step.operator == operator
+                and not step.reverse
+            ):
+                steps += step.steps
+            else:
+                steps.append(step)
+        return ComposedStep(steps=steps, operator=operator)
+
+    def _check(self) -> typing.Callable:
+        """
+        Return a function that runs the check for one item (without reverse).
+        """
+        return self._memoize(functools.partial(self._run, **self.kwargs))
 
-        # We don't want to update the original class
-        this = copy.deepcopy(self)
-
-        # Previous _run functions added to the class by name
-        run1_func = this.name + "_run"
-        run2_func = other.name + "_run"
-
-        # Combine kwargs to pass to both
-        combined_kwargs = copy.deepcopy(this.kwargs)
-        combined_kwargs.update(other.kwargs)
-
-        # Assemble list of previously composed functions
-        composed = copy.deepcopy(this.compose)
-        composed += other.compose
-
-        # Add each to composed
-        for item in [(run1_func, this.reverse), (run2_func, other.reverse)]:
-            composed.append(
-                {"func": item[0], "reversed": item[1], "operator": operator}
-            )
-
-        # The custom run should run the first and second
-        def _run(self, item: typing.Any, **kwargs) -> bool:
-            result = None
-
-            # Update the result with each check
-            for entry in self.composed:
-                # If we don't have a result, AND is True, OR is False
-                if result is None:
-                    result = True if operator == "AND" else False
-                res = getattr(self, entry["func"])(item, **kwargs)
-                if entry["reversed"]:
-                    res = not res
-                if operator == "AND":
-                    result = result and res
-                else:
-                    result = result or res
-            return result
+    def compile(self) -> typing.Callable:
+        """
+        Return a function that takes an item and returns True to keep it.
+        """
+        if "_checker" not in self.__dict__:
+            self._checker = self._check()
+        check = self._checker
+        if self.reverse:
+            return lambda item: not check(item)
+        return check
 
-        # Create a new Class named by the two classes we are combining
-        classname = "%s_%s_%s" % (
-            this.operator_name,
-            operator.upper(),
-            other.operator_name,
-        )
-        combined = type(
-            classname,
-            (this.baseclass,),
-            {
-                "_run": _run,
-                run1_func: this._run,
-                run2_func: other._run,
-                "composed": composed,
-                "kwargs": combined_kwargs,
-            },
-        )
-        return combined(**combined_kwargs)
+    def outcomes(self, items: list) -> list:
+        """
+        Return a list with True for each item that we keep.
+        """
+        if self.is_batched:
+            outcomes = self._evaluate_batch(items)
+        else:
+            check = self.compile()
+            return [bool(check(item)) for item in items]
+        if self.reverse:
+            return [not outcome for outcome in outcomes]
+        return [bool(outcome) for outcome in outcomes]
 
     def run(self, items: list) -> list:
         """
@@ -249,20 +526,270 @@ class BooleanStep(BaseStep):
         This function checks that required arguments are provided, and then
         calls the underlying _run that should be implemented by the step.
         """
-        keepers = []
-        for item in items:
-            # Keep the item if the outcome is True
-            outcome = self._run(item, **self.kwargs)
+        return list(self.stream(items))
+
+    def run_batch(self, batch: ItemBatch, **kwargs) -> ItemBatch:
+        """
+        Mark the rows of a batch to keep, without copying the values.
+        """
+        if not self.is_fusable:
+            return super().run_batch(batch, **kwargs)
+        return batch.select(self.outcomes(batch.compact().values))
 
-            # True == keep, and we don't want to reverse that logic
-            if outcome and not self.reverse:
-                keepers.append(item)
+    @property
+    def is_barrier(self) -> bool:
+        """
+        A step that provides its own run is a barrier.
+        """
+        return self.barrier or type(self).run is not BooleanStep.run
 
-            # False == keep
-            if not outcome and self.reverse:
-                keepers.append(item)
-        return keepers
+    def stream(self, items: typing.Iterable) -> typing.Iterator:
+        """
+        Lazily yield the items that pass the check.
+        """
+        if self.is_barrier:
+            yield from super().stream(items)
+            return
+
+        if self.is_batched:
+            for batch, outcomes in self._map_batches(items):
+                if self.reverse:
+                    outcomes = map(operator.not_, outcomes)
+                yield from itertools.compress(batch, outcomes)
+            return
+
+        # Keep the item if the outcome is True
+        for item, outcome in self._map(items):
+            if self._keep(outcome):
+                yield item
+
+    async def astream(
+        self, items: typing.AsyncIterable, concurrency=None
+    ) -> typing.AsyncIterator:
+        """
+        Lazily yield the items that pass the check from an async iterable.
+        """
+        if self.is_barrier:
+            async for item in super().astream(items, concurrency):
+                yield item
+            return
+
+        async for item, outcome in self._amap(items, concurrency):
+            if self._keep(outcome):
+                yield item
+
+    def _keep(self, outcome) -> bool:
+        """
+        Determine if we keep an item based on the outcome of _run
+        """
+        # True == keep, and we don't want to reverse that logic
+        # False == keep if we are reversed
+        return bool(outcome) != self.reverse
 
     @abc.abstractmethod
     def _run(self, item: typing.Any, **kwargs) -> bool:
         raise NotImplementedError("A step must have a _run function.")
+
+
+class ComposedStep(BooleanStep):
+    """
+    A logical combination (AND or OR) of boolean steps, e.g., "a & ~b".
+
+    The steps form an expression tree that is compiled into one function,
+    so a check stops as soon as the result is known (e.g., the first False
+    for AND) and each step is run with its own kwargs.
+    """
+
+    def __init__(self, steps=None, operator="AND", **kwargs):
+        self.steps = steps or []
+        self.operator = operator
+        super().__init__(**kwargs)
+
+    @property
+    def name(self):
+        """
+        Name the step by the steps it combines, e.g., A_AND_NotB
+        """
+        return ("_%s_" % self.operator).join(x.operator_name for x in self.steps)
+
+    @property
+    def spec(self) -> dict:
+        spec = super().spec
+        spec.update({"operator": self.operator, "steps": [x.spec for x in self.steps]})
+        return spec
+
+    def _check(self) -> typing.Callable:
+        """
+        Compile the steps into one function that short-circuits.
+        """
+        checks = [step.compile() for step in self.steps]
+
+        if self.operator == "AND":
+
+            def check(item):
+                for step_check in checks:
+                    if not step_check(item):
+                        return False
+                return True
+
+        else:
+
+            def check(item):
+                for step_check in checks:
+                    if step_check(item):
+                        return True
+                return False
+
+        return check
+
+    def _run(self, item: typing.Any, **kwargs) -> bool:
+        if "_checker" not in self.__dict__:
+            self._checker = self._check()
+        return self._checker(item)
+
+    def _run_batch(self, items: list, **kwargs) -> list:
+        """
+        Run each step only on the items that are not decided yet.
+        """
+        is_and = self.operator == "AND"
+        results = [is_and] * len(items)
+        undecided = list(range(len(items)))
+        for step in self.steps:
+            if not undecided:
+                break
+            outcomes = step.outcomes([items[i] for i in undecided])
+
+            # An item is decided by a False for AND, or a True for OR
+            remaining = []
+            for index, outcome in zip(undecided, outcomes):
+                if outcome != is_and:
+                    results[index] = outcome
+                else:
+                    remaining.append(index)
+            undecided = remaining
+        return results
+
+
+class AsyncMixin:
+    """
+    An async step has an async _run, e.g., to look up metadata for an item.
+
+    In an async pipeline (Pipeline.arun) calls to _run for different items
+    overlap, up to a maximum concurrency. In a regular pipeline the step
+    still works, and runs batches of items in its own event loop. With a
+    cache, results are remembered and an item already in flight is awaited
+    instead of run again.
+    """
+
+    # The maximum number of calls to _run to have in flight
+    concurrency = None
+
+    # Calls to _run are coroutines, and can't be fused into a loop
+    is_fusable = False
+
+    async def _amap(
+        self, items: typing.AsyncIterable, concurrency=None
+    ) -> typing.AsyncIterator:
+        """
+        Yield tuples of (item, result of _run) in the order of the items.
+        """
+        concurrency = self.concurrency or concurrency or 10
+        run = self._amemoize()
+        pending = collections.deque()
+        try:
+            async for item in items:
+                task = asyncio.ensure_future(run(item))
+                pending.append((item, task))
+                if len(pending) >= concurrency:
+                    item, task = pending.popleft()
+                    yield item, await task
+            while pending:
+                item, task = pending.popleft()
+                yield item, await task
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    def _map(self, items: typing.Iterable) -> typing.Iterator:
+        """
+        Outside of an event loop, run batches of items in our own loop.
+        """
+        concurrency = self.concurrency or 10
+        run = self._amemoize()
+        loop = asyncio.new_event_loop()
+        try:
+            batch = []
+            for item in items:
+                batch.append(item)
+                if len(batch) >= concurrency:
+                    yield from self._map_batch(loop, batch, run)
+                    batch = []
+            yield from self._map_batch(loop, batch, run)
+        finally:
+            loop.close()
+
+    def _map_batch(self, loop, batch: list, run: typing.Callable) -> typing.Iterator:
+        """
+        Run _run for a batch of items concurrently, and yield in order.
+        """
+        if not batch:
+            return
+        results = loop.run_until_complete(self._gather(batch, run))
+        yield from zip(batch, results)
+
+    async def _gather(self, batch: list, run: typing.Callable) -> list:
+        """
+        Await _run for a batch of items.
+        """
+        return await asyncio.gather(*[run(x) for x in batch])
+
+    def _amemoize(self) -> typing.Callable:
+        """
+        Return a coroutine function for _run that remembers results if we have
+        a cache. Calls for an item that is in flight await the same task.
+        """
+        run = functools.partial(self._run, **self.kwargs)
+        if self.cache is None:
+            return run
+        cache = self.cache
+        frozen = utils.freeze(self.kwargs)
+        pending = {}
+
+        async def memoized(item):
+            key = (frozen, item if type(item) is str else str(item))
+            task = pending.get(key)
+            if task is not None:
+                cache.hit()
+                return await task
+            result = cache.get(key)
+            if result is not cache.missing:
+                return result
+            task = pending[key] = asyncio.ensure_future(run(item))
+            try:
+                result = await task
+            finally:
+                del pending[key]
+            cache.set(key, result)
+            return result
+
+        return memoized
+
+
+class AsyncStep(AsyncMixin, Step):
+    """
+    An async step returns a new item or None, and has an async _run.
+    """
+
+    @abc.abstractmethod
+    async def _run(self, item: typing.Any, **kwargs) -> typing.Any:
+        raise NotImplementedError("A step must have a _run function.")
+
+
+class AsyncBooleanStep(AsyncMixin, BooleanStep):
+    """
+    An async boolean step must return true or false, and has an async _run.
+    """
+
+    @abc.abstractmethod
+    async def _run(self, item: typing.Any, **kwargs) -> bool:
+        raise NotImplementedError("A step must have a _run function.")
@@ -17,3 +17,6 @@ class ToInteger(step.Step):
 
     def _run(self, item, **kwargs):
         return str(item)
+
+    def _run_batch(self, items, **kwargs) -> list:
+        return [str(item) for item in items]
@@ -2,7 +2,7 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
-from pipelib.steps import step
+from pipelib.steps import step, vectorized
 
 # Filters take some string and return true/false if a condition passes
 
@@ -22,6 +22,13 @@ class ToLowercase(step.Step):
     def _run(self, item, **kwargs):
         return item.lower()
 
+    def _run_batch(self, items, **kwargs) -> list:
+        if vectorized.enabled(items):
+            result = vectorized.to_lowercase(items)
+            if result is not None:
+                return result
+        return [item.lower() for item in items]
+
 
 class ToString(step.Step):
     """
@@ -38,6 +45,9 @@ class ToString(step.Step):
     def _run(self, item, **kwargs):
         return str(item)
 
+    def _run_batch(self, items, **kwargs) -> list:
+        return [str(item) for item in items]
+
 
 class SplitAndJoinN(step.Step):
     """
@@ -62,3 +72,18 @@ class SplitAndJoinN(step.Step):
         split_n = kwargs.get("split_n")
         join_by = kwargs.get("join_by")
         return join_by.join(item.split(split_by, split_n))
+
+    def _run_batch(self, items, **kwargs) -> list:
+        split_by = kwargs.get("split_by")
+        split_n = kwargs.get("split_n")
+        join_by = kwargs.get("join_by")
+        if vectorized.enabled(items):
+            result = vectorized.split_and_join(items, split_by, join_by, split_n)
+            if result is not None:
+                return result
+
+        # Splitting and joining is a replace, unless we split on whitespace
+        if split_by:
+            return [item.replace(split_by, join_by, split_n) for item in items]
+        join = join_by.join
+        return [join(item.split(split_by, split_n)) for item in items]
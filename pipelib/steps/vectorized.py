@@ -0,0 +1,164 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+# Optional NumPy backend to evaluate string steps (and sort versions) at once
+
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Use the vectorized backend for batches with at least this many items
+threshold = 10000
+
+# Converting a Python list to an array costs more than most string steps
+# save, so by default we only switch on for batches that are already arrays
+convert_lists = False
+
+
+def enabled(items) -> bool:
+    """
+    Determine if we should use the vectorized backend for a batch of items.
+    """
+    if numpy is None or threshold is None or len(items) < threshold:
+        return False
+    return convert_lists or isinstance(items, numpy.ndarray)
+
+
+def as_array(items):
+    """
+    Convert a batch of items into a NumPy string array.
+    """
+    if isinstance(items, numpy.ndarray) and items.dtype.kind == "U":
+        return items
+    return numpy.array(items, dtype=str)
+
+
+def as_ascii(items):
+    """
+    Convert a batch of items into a NumPy bytes array, for steps that only
+    understand ASCII. Return None if any item is not ASCII.
+    """
+    try:
+        return as_array(items).astype("S")
+    except UnicodeEncodeError:
+        return None
+
+
+def has_min_length(items, length) -> list:
+    """
+    Determine if each item is not empty and has a minimum length.
+    """
+    lengths = numpy.char.str_len(as_array(items))
+    return ((lengths > 0) & (lengths >= length)).tolist()
+
+
+def has_max_length(items, length) -> list:
+    """
+    Determine if each item is not empty and has a maximum length.
+    """
+    lengths = numpy.char.str_len(as_array(items))
+    return ((lengths > 0) & (lengths <= length)).tolist()
+
+
+def has_all_letters(items):
+    """
+    Determine if each item is only ASCII letters (or empty).
+    """
+    values = as_ascii(items)
+    if values is None:
+        return
+    return (numpy.char.isalpha(values) | (numpy.char.str_len(values) == 0)).tolist()
+
+
+def has_all_lower_letters_numbers(items):
+    """
+    Determine if each item is only lowercase ASCII letters and numbers (or empty).
+    """
+    values = as_ascii(items)
+    if values is None:
+        return
+    lower = numpy.char.isalnum(values) & (numpy.char.lower(values) == values)
+    return (lower | (numpy.char.str_len(values) == 0)).tolist()
+
+
+def to_lowercase(items):
+    """
+    Convert each (ASCII) item to lowercase.
+    """
+    values = as_ascii(items)
+    if values is None:
+        return
+    return numpy.char.lower(values).astype(str).tolist()
+
+
+def split_and_join(items, split_by, join_by, split_n=-1):
+    """
+    Split each item by a delimiter (up to split_n times) and join by another.
+    """
+    # Splitting on whitespace (None) or an empty string is not a replace
+    if not split_by:
+        return
+    values = as_array(items)
+    if split_n is None or split_n < 0:
+        return numpy.char.replace(values, split_by, join_by).tolist()
+    return numpy.char.replace(values, split_by, join_by, split_n).tolist()
+
+
+# Sort and select container tags with numpy for at least this many tags
+sort_threshold = 10000
+
+
+def sort_enabled(items) -> bool:
+    """
+    Determine if we should sort and select a list of versions with numpy.
+    """
+    return (
+        numpy is not None
+        and sort_threshold is not None
+        and len(items) >= sort_threshold
+    )
+
+
+def select_versions(versions, levels) -> list:
+    """
+    Sort versions (tuples of components) newest first, and keep the newest of
+    each group, where levels are the prefix lengths (1 major, 2 minor, 3 patch)
+    to keep unique. Return the indices of the kept versions, or None if the
+    components don't fit in a 64 bit integer.
+
+    Each version belongs to the longest level it has components for. It is
+    kept if it is the first version in its group, ignoring versions that
+    belong to a shorter level (those don't mark the group as seen).
+    """
+    lengths = numpy.fromiter(map(len, versions), dtype=numpy.int64, count=len(versions))
+    width = max(int(lengths.max(initial=0)), 1)
+    try:
+        values = numpy.fromiter(itertools.chain.from_iterable(versions), numpy.int64)
+    except OverflowError:
+        return
+
+    # Pad with -1 so a shorter version sorts before a longer one (1.2 < 1.2.0)
+    matrix = numpy.full((len(versions), width), -1, dtype=numpy.int64)
+    matrix[numpy.arange(width) < lengths[:, None]] = values
+
+    # Negate for a descending sort that keeps equal versions in input order
+    order = numpy.lexsort(-matrix.T[::-1])
+    matrix = matrix[order]
+    lengths = lengths[order]
+
+    level = numpy.zeros(len(versions), dtype=numpy.int64)
+    for n in sorted(levels):
+        level[lengths >= n] = n
+
+    keep = numpy.zeros(len(versions), dtype=bool)
+    for n in levels:
+        rows = numpy.flatnonzero(level >= n)
+        prefix = matrix[rows, :n]
+        first = numpy.ones(len(rows), dtype=bool)
+        first[1:] = (prefix[1:] != prefix[:-1]).any(axis=1)
+        keep[rows[first & (level[rows] == n)]] = True
+    return order[keep].tolist()
@@ -263,3 +263,477 @@ def test_docker_tags_pipeline():
     updated = p.run(tags)
     assert len(updated) == 1
     assert "0.9.36.0" in updated
+
+
+def test_stream_pipeline():
+    """
+    Test that a streamed pipeline is lazy and matches run
+    """
+    consumed = []
+
+    def generate():
+        for item in ["item-ONE", "item-TWO", "item-three", "item-FOUR"]:
+            consumed.append(item)
+            yield item
+
+    steps = (
+        step.transform.ToLowercase(),
+        ~step.filters.HasPatterns(filters=["two"]),
+    )
+    p = pipeline.Pipeline(steps)
+
+    # Only the items needed for the first result are pulled
+    stream = p.stream(generate())
+    assert next(stream) == "item-one"
+    assert consumed == ["item-ONE"]
+    assert list(stream) == ["item-three", "item-four"]
+
+    # A sort is a barrier, and the result should be the same as run
+    p = pipeline.Pipeline(steps + (step.sort.BasicSort(reverse=True),))
+    assert list(p.stream(generate())) == ["item-three", "item-one", "item-four"]
+    assert list(p.stream(generate())) == p.run(generate())
+
+
+def test_parallel_pipeline(monkeypatch):
+    """
+    Test that running with a pool of workers preserves order
+    """
+    import pipelib.wrappers as wrappers
+
+    monkeypatch.setattr(pipeline, "min_chunk_size", 10)
+    items = ["%s.%s.%s--%s" % (i % 3, i % 7, i % 11, i) for i in range(500)]
+    steps = (
+        ~step.filters.HasPatterns(filters=["--1[0-9]$"]),
+        step.filters.CleanCommit(),
+        step.container.ContainerTagSort(unique_minor=True),
+        step.filters.HasMinLength(length=4),
+    )
+    p = pipeline.Pipeline(steps)
+    expected = p.run(items)
+    assert expected
+    assert p.run(items, workers=2) == expected
+    assert [segment[0] for segment in p.segments()] == [False, True, False]
+
+    # Workers send back values, and the originals are kept here
+    result = p.run(items, workers=2, unwrap=False)
+    assert [x._original for x in result] == [x._original for x in p.run(items, False)]
+    full = pipeline.Pipeline(steps, provenance="full")
+    result = full.run(items, workers=2, unwrap=False)
+    history = [wrappers.get_history(x) for x in full.run(items, unwrap=False)]
+    assert [wrappers.get_history(x) for x in result] == history
+
+
+def test_thread_pipeline(monkeypatch):
+    """
+    Test running a pipeline with a thread pool executor
+    """
+    monkeypatch.setattr(pipeline, "min_chunk_size", 10)
+    items = ["Item-%s" % i for i in range(200)]
+    p = pipeline.Pipeline(
+        (step.transform.ToLowercase(), ~step.filters.HasPatterns(filters=["3"]))
+    )
+    assert p.run(items, workers=4, executor="thread") == p.run(items)
+
+
+def test_async_pipeline():
+    """
+    Test an async pipeline with async and regular steps
+    """
+    import asyncio
+
+    from pipelib.steps import step as base
+
+    class LookupDate(base.AsyncStep):
+        """
+        Pretend to look up a date for a tag, with latency.
+        """
+
+        async def _run(self, item, **kwargs):
+            await asyncio.sleep(0.01)
+            return "%s@2022" % item
+
+    class IsStable(base.AsyncBooleanStep):
+        """
+        Pretend to ask if a tag is a stable release.
+        """
+
+        async def _run(self, item, **kwargs):
+            await asyncio.sleep(0.01)
+            return "rc" not in item
+
+    async def generate():
+        for i in range(50):
+            yield "1.%s.0" % i if i % 5 else "1.%s.0-rc" % i
+
+    p = pipeline.Pipeline(
+        (IsStable(), step.filters.HasMinLength(length=6), LookupDate())
+    )
+    expected = ["1.%s.0@2022" % i for i in range(10, 50) if i % 5]
+    assert asyncio.run(p.arun(generate(), concurrency=50)) == expected
+
+    # Regular iterables, and a regular run, give the same result
+    items = ["1.%s.0" % i if i % 5 else "1.%s.0-rc" % i for i in range(50)]
+    assert asyncio.run(p.arun(items)) == expected
+    assert p.run(items) == expected
+
+    # With a cache each unique item is looked up once (also when in flight)
+    class Lookup(base.AsyncStep):
+        calls = 0
+
+        async def _run(self, item, **kwargs):
+            Lookup.calls += 1
+            await asyncio.sleep(0.01)
+            return item.upper()
+
+    step_with_cache = Lookup(cache=10)
+    p = pipeline.Pipeline(step_with_cache)
+    assert asyncio.run(p.arun(["a"] * 5 + ["b"])) == ["A"] * 5 + ["B"]
+    assert p.run(["a", "b", "c"] * 3) == ["A", "B", "C"] * 3
+    assert Lookup.calls == 3
+    assert step_with_cache.cache.hits == 12
+
+
+def test_parallel_composed_pipeline(monkeypatch):
+    """
+    Test that composed steps can be sent to workers
+    """
+    monkeypatch.setattr(pipeline, "min_chunk_size", 10)
+    import pipelib.pipelines as pipelines
+
+    items = ["%s.%s--%s" % (i % 5, i % 9, "abcdef%s" % i) for i in range(100)]
+    items += ["abcdefghi", "abcdef123"]
+    p = pipeline.Pipeline((pipelines.git.RemoveCommits,))
+    expected = p.run(items)
+    assert "0.0--abcdef0" in expected
+    assert "abcdef123" not in expected and "abcdefghi" not in expected
+    assert p.run(items, workers=2) == expected
+
+
+def test_compiled_pipeline():
+    """
+    Test that a compiled pipeline fuses steps and gives the same result
+    """
+    import pipelib.pipelines as pipelines
+
+    items = ["%s.%s.%s--H%s_%s" % (i % 3, i % 7, i % 11, i, i % 4) for i in range(300)]
+    items += ["boost1.60", "abcdef123", "ishouldberemoved"]
+    steps = (
+        ~step.filters.HasPatterns(filters=["boost"]),
+        pipelines.git.RemoveCommits,
+        step.transform.ToLowercase(),
+        step.filters.CleanCommit(),
+        step.container.ContainerTagSort(unique_minor=True),
+        step.filters.HasMaxLength(length=7),
+        step.transform.SplitAndJoinN(split_by=".", join_by="-"),
+    )
+    p = pipeline.Pipeline(steps)
+    compiled = p.compile()
+    assert [str(stage) for stage in compiled.stages] == [
+        "Fused(NotHasPatterns, HasMinLength_AND_NotHasAllLowerLettersNumbers, "
+        "ToLowercase, CleanCommit)",
+        "ContainerTagSort",
+        "Fused(HasMaxLength, SplitAndJoinN)",
+    ]
+    assert compiled.run(items) == p.run(items)
+
+    # The original is kept for transformed items
+    result = compiled.run(items, unwrap=False)
+    assert [x._original for x in result] == [x._original for x in p.run(items, False)]
+
+    # Steps without a _run_batch are fused into a generated loop
+    class Reverse(step.step.Step):
+        def _run(self, item, **kwargs):
+            return item[::-1]
+
+    p = pipeline.Pipeline((step.transform.ToLowercase(), Reverse(), Reverse()))
+    compiled = p.compile()
+    assert compiled.stages[0].source.count("def fused") == 1
+    assert compiled.run(items, unwrap=False) == p.run(items, unwrap=False)
+
+
+def test_cached_pipeline(tmp_path):
+    """
+    Test that results are saved to and loaded from a cache directory
+    """
+    import os
+
+    import pipelib.cache as cache
+
+    items = ["1.0.0", "2.1.0", "v3-beta", "ishouldberemoved", "2.2.0"]
+    steps = (
+        step.filters.HasMaxLength(length=8),
+        step.container.ContainerTagSort(unique_major=True),
+    )
+    p = pipeline.Pipeline(steps)
+    expected = p.run(items)
+
+    # The first run saves a result under the fingerprint
+    assert p.run(items, cache_dir=tmp_path) == expected
+    fingerprint = p.fingerprint
+    assert os.listdir(tmp_path) == [fingerprint]
+    assert len(os.listdir(tmp_path / fingerprint)) == 1
+
+    # A second pipeline with the same steps uses it, with the originals
+    same = pipeline.Pipeline(
+        (
+            step.filters.HasMaxLength(length=8),
+            step.container.ContainerTagSort(unique_major=True),
+        )
+    )
+    assert same.fingerprint == fingerprint
+    same.steps = []
+    assert same.fingerprint != fingerprint
+
+    same = pipeline.Pipeline(steps)
+    result = same.run(items, unwrap=False, cache_dir=tmp_path)
+    assert [str(x) for x in result] == expected
+    assert [x._original for x in result] == [
+        x._original for x in p.run(items, unwrap=False)
+    ]
+
+    # Results without the originals aren't used for a run that keeps them
+    lower = (step.transform.ToLowercase(),)
+    pipeline.Pipeline(lower, provenance="none").run(["ABC"], cache_dir=tmp_path)
+    result = pipeline.Pipeline(lower).run(["ABC"], cache_dir=tmp_path, unwrap=False)
+    assert result[0]._original == "ABC"
+
+    # Changing kwargs, reverse, or composition changes the fingerprint
+    fingerprints = {
+        pipeline.Pipeline(s).fingerprint
+        for s in [
+            step.filters.HasMaxLength(length=8),
+            step.filters.HasMaxLength(length=9),
+            ~step.filters.HasMaxLength(length=8),
+            step.filters.HasMaxLength(length=8) & step.filters.HasAllLetters(),
+            step.filters.HasMaxLength(length=8) | step.filters.HasAllLetters(),
+        ]
+    }
+    assert len(fingerprints) == 5
+
+    # New items are a new result, and the oldest are evicted over max_size
+    store = cache.DiskCache(tmp_path, max_size=1)
+    assert p.run(items[:3], cache_dir=store) == p.run(items[:3])
+    assert len(os.listdir(tmp_path / fingerprint)) == 0
+
+    # The size is kept as we write, and threads can write the same result
+    import concurrent.futures
+
+    store = cache.DiskCache(tmp_path / "threads")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: store.set("f", "h", items * 100), range(32)))
+    assert os.listdir(tmp_path / "threads" / "f") == ["h.json"]
+    assert [str(x) for x in store.get("f", "h")] == items * 100
+    assert store.size == os.path.getsize(store.path("f", "h"))
+
+
+def test_incremental_pipeline(tmp_path):
+    """
+    Test that an incremental pipeline gives the same result as a run
+    """
+    import random
+
+    import pipelib.pipelines as pipelines
+
+    random.seed(1)
+
+    def get_tag():
+        if random.random() < 0.1:
+            return "".join(random.choice("abcdef0123456789") for _ in range(9))
+        return "%s.%s.%s" % tuple(random.randint(0, 10) for _ in range(3))
+
+    steps = (
+        pipelines.git.RemoveCommits,
+        step.transform.ToLowercase(),
+        step.container.ContainerTagSort(unique_minor=True),
+        step.filters.HasMaxLength(length=4),
+    )
+    p = pipeline.Pipeline(steps)
+    items = [get_tag() for _ in range(500)]
+    inc = p.incremental()
+    assert [str(x) for x in inc.stages] == [
+        "ItemStage(HasMinLength_AND_NotHasAllLowerLettersNumbers, ToLowercase)",
+        "ContainerTagSort",
+        "ItemStage(HasMaxLength)",
+    ]
+    assert inc.update(added=items) == p.run(items)
+
+    for _ in range(10):
+        removed = random.sample(items, 10)
+        added = [get_tag() for _ in range(10)]
+        for item in removed:
+            items.remove(item)
+        items += added
+        assert inc.update(added=added, removed=removed) == p.run(items)
+        assert inc.items == items
+
+    # The state can be saved, and is loaded for the same pipeline
+    path = str(tmp_path / "state.pkl")
+    inc.save(path)
+    loaded = p.incremental(path)
+    assert loaded.items == items
+    assert loaded.update(added=["1.1.1"], removed=items[:5]) == p.run(
+        items[5:] + ["1.1.1"]
+    )
+    assert pipeline.Pipeline(steps[:2]).incremental(path).items == []
+    assert pipeline.Pipeline(steps, provenance="none").incremental(path).items == []
+
+    # A run with new items only adds and removes the difference
+    items = items[10:] + ["2.2.2"]
+    assert loaded.run(items) == p.run(loaded.items)
+    assert sorted(loaded.items) == sorted(items)
+
+
+def test_provenance_pipeline():
+    """
+    Test that a pipeline keeps none, the original, or the full history
+    """
+    import pytest
+
+    import pipelib.wrappers as wrappers
+
+    steps = (
+        step.transform.ToLowercase(),
+        ~step.filters.HasPatterns(filters=["two"]),
+        step.transform.SplitAndJoinN(split_by=".", join_by="-"),
+    )
+    items = ["Item.ONE", "item.TWO", "item-three", 4]
+    expected = ["item-one", "item-three", "4"]
+
+    # By default we keep the original, and a wrapper has no dictionary
+    p = pipeline.Pipeline(steps)
+    result = p.run(items, unwrap=False)
+    assert result == expected
+    assert [x._original for x in result] == ["Item.ONE", "item-three", 4]
+    assert not hasattr(result[0], "__dict__")
+
+    # No provenance gives plain strings
+    p = pipeline.Pipeline(steps, provenance="none")
+    result = p.run(items, unwrap=False)
+    assert result == expected and all(type(x) is str for x in result)
+    assert list(p.stream(items, unwrap=False)) == expected
+
+    # Full provenance has every value
+    p = pipeline.Pipeline(steps, provenance="full")
+    for result in [p.run(items, unwrap=False), p.compile().run(items, unwrap=False)]:
+        assert [x._history for x in result] == [
+            ("Item.ONE", "item.one", "item-one"),
+            ("item-three",),
+            ("4",),
+        ]
+
+    # A stream only sets the provenance while it runs
+    stream = p.stream(items, unwrap=False)
+    assert next(stream)._history[-1] == "item-one"
+    assert wrappers.provenance.get() == "original"
+
+    with pytest.raises(SystemExit):
+        pipeline.Pipeline(steps, provenance="some")
+
+
+def test_parse_once_pipeline():
+    """
+    Test that steps that consume versions reuse those parsed by earlier steps
+    """
+    import pipelib.wrappers as wrappers
+    from pipelib.wrappers.version import parse_version
+
+    tags = ["1.2.3--abc123", "v2.0.0", "3", "v4", "1.2.4_def456", "v2"]
+    steps = (
+        step.filters.CleanCommit(),
+        step.container.ContainerTagSort(unique_major=True),
+        step.release.VersionRange(constraint=">=2"),
+        step.release.MajorTagSort(),
+    )
+    for provenance in ["none", "original", "full"]:
+        for unwrap in [True, False]:
+            parse_version.cache_clear()
+            p = pipeline.Pipeline(steps, provenance=provenance)
+            assert p.run(tags, unwrap=unwrap) == ["v4", "3"]
+
+            # Each tag is parsed once, by the first sort
+            assert parse_version.cache_info().hits == 0
+            assert parse_version.cache_info().misses == len(tags)
+
+    # A step can produce a wrapper for the steps that follow it
+    to_version = step.transform.ToLowercase()
+    to_version.produces = wrappers.VersionWrapper
+    result = pipeline.Pipeline(to_version).run(["V1.2"], unwrap=False)
+    assert type(result[0]) is wrappers.VersionWrapper
+    assert result[0].version == [1, 2] and result[0]._original == "V1.2"
+
+
+def test_transform_after_version_sort():
+    """
+    Test that a transform after a version sort gives items we can sort again
+    """
+    import pipelib.wrappers as wrappers
+
+    steps = (
+        step.container.ContainerTagSort(),
+        step.transform.ToLowercase(),
+        step.sort.BasicSort(),
+    )
+    items = ["1.2.3", "1.2.4-RC", "1.3.0"]
+    expected = ["1.2.3", "1.2.4-rc", "1.3.0"]
+    for provenance in ["none", "original", "full"]:
+        p = pipeline.Pipeline(steps, provenance=provenance)
+        assert p.run(items) == expected
+        assert list(p.stream(items)) == expected
+        assert p.incremental().run(items) == expected
+        result = list(p.stream(items, unwrap=False))
+        assert not any(isinstance(x, wrappers.VersionWrapper) for x in result)
+
+
+def test_run_file(tmp_path):
+    """
+    Test running a pipeline over the lines of a file, read in chunks
+    """
+    import pipelib.utils as utils
+
+    tags = ["1.2.3--abc123", "v2.0.0", "", "3", "v4", "1.2.4_def456", "café", "v2"]
+    filename = str(tmp_path / "tags.txt")
+    utils.write_file(filename, "\r\n".join(tags) + "\n")
+    lines = [x for x in tags if x]
+
+    # Any chunk size gives the same lines
+    for chunk_size in [1, 7, 2**22]:
+        source = utils.LineSource(filename, chunk_size=chunk_size)
+        assert list(source) == lines
+        if chunk_size == 1:
+            assert len(list(source.chunks())) == len(tags)
+
+    steps = (
+        step.transform.ToLowercase(),
+        step.filters.CleanCommit(),
+        step.container.ContainerTagSort(),
+        step.filters.HasMaxLength(length=5),
+    )
+    for provenance in ["none", "original", "full"]:
+        p = pipeline.Pipeline(steps, provenance=provenance)
+        expected = p.run(lines)
+        assert p.run_file(filename, chunk_size=7) == expected
+        assert list(p.stream(utils.LineSource(filename))) == expected
+        result = p.run_file(filename, unwrap=False, chunk_size=7)
+        assert [str(x) for x in result] == expected
+
+    # Results of the chunks are plain strings if we unwrap, and otherwise
+    # only those that changed are wrapped
+    class Collect(step.step.Step):
+        def run(self, items, **kwargs):
+            seen[:] = items
+            return items
+
+    seen = []
+    p = pipeline.Pipeline(steps[:2] + (Collect(),))
+    expected = p.run(lines)
+    assert p.run_file(filename) == expected
+    assert all(type(x) is str for x in seen)
+    p.run_file(filename, unwrap=False)
+    wrapped = [x for x in seen if type(x) is not str]
+    assert wrapped and all(str(x) != x._original for x in wrapped)
+
+    # No barriers (everything runs in chunks) and an empty file
+    p = pipeline.Pipeline(step.transform.ToLowercase())
+    assert p.run_file(filename, chunk_size=3) == [x.lower() for x in lines]
+    utils.write_file(filename, "")
+    assert p.run_file(filename) == [] and list(utils.LineSource(filename)) == []
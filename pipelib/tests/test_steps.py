@@ -6,11 +6,51 @@
 # Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
 # with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import concurrent.futures
+import random
+import re
+
 import pytest
 
 import pipelib.utils
-from pipelib.steps import iter_steps
+from pipelib.steps import filters, iter_steps, transform, vectorized
+from pipelib.steps.container.tags import ContainerTagSort
+from pipelib.steps.release.constraints import VersionRange
 from pipelib.steps.release.tags import MajorTagSort
+from pipelib.steps.sort.basic import BasicSort
+from pipelib.steps.step import BooleanStep
+from pipelib.wrappers.version import VersionWrapper
+
+
+class Counted(BooleanStep):
+    """
+    Keep items that contain a letter, and count the calls (in calls).
+    """
+
+    required = ["letter"]
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = []
+
+    def _run(self, item, **kwargs):
+        self.calls.append(item)
+        return kwargs["letter"] in item
+
+
+def generate_tags(count, largest=4, longest=4, seed=0) -> list:
+    """
+    Generate the same random tags (e.g., v1.0.4 or 3.2) for a seed.
+    """
+    generator = random.Random(seed)
+    tags = []
+    for _ in range(count):
+        parts = [
+            str(generator.randint(0, largest))
+            for _ in range(generator.randint(1, longest))
+        ]
+        tags.append(generator.choice(["", "v"]) + ".".join(parts))
+    return tags
 
 
 @pytest.mark.parametrize("step_type,step_name,step_module", list(iter_steps()))
@@ -41,3 +81,359 @@ def test_release_tags() -> None:
     step = MajorTagSort(ascending=False)
     filtered = step.run(items)
     assert [str(x) for x in filtered] == ["v3", "v2-beta", "v1"]
+
+
+def test_step_threads() -> None:
+    """
+    Test that a step with threads keeps the order of results
+    """
+    import time
+
+    from pipelib.steps import step
+
+    class SlowUpper(step.Step):
+        """
+        Uppercase an item, where earlier items take longer.
+        """
+
+        def _run(self, item, **kwargs):
+            time.sleep(0.001 * (10 - int(item[-1])))
+            return item.upper()
+
+    items = ["item%s" % i for i in range(10)]
+    expected = [x.upper() for x in items]
+    assert SlowUpper(threads=4).run(items) == expected
+    assert list(SlowUpper(threads=4).stream(iter(items))) == expected
+    assert SlowUpper().threads is None
+
+
+@pytest.mark.parametrize(
+    "step_instance",
+    [
+        filters.HasMinLength(length=4),
+        filters.HasMaxLength(length=4),
+        filters.HasPatterns(filters=["one", "^t"]),
+        filters.HasAllLetters(),
+        filters.HasAllLowerLettersNumbers(),
+        filters.CleanCommit(),
+        transform.ToLowercase(),
+        transform.ToString(),
+        transform.SplitAndJoinN(split_by="-", join_by="_", split_n=1),
+    ],
+)
+def test_run_batch(step_instance) -> None:
+    """
+    Test that _run_batch gives the same results as _run
+    """
+    items = ["", "one", "two-three", "Four", "five5", "0.9.10--hdbcaa40_3", "x\n"]
+    assert step_instance.is_batched
+    expected = [step_instance._run(x, **step_instance.kwargs) for x in items]
+    assert step_instance._run_batch(items, **step_instance.kwargs) == expected
+
+    # A subclass that overrides _run should not use the parent _run_batch
+    class Custom(step_instance.__class__):
+        def _run(self, item, **kwargs):
+            return item
+
+    assert not Custom(**step_instance.kwargs).is_batched
+
+
+@pytest.mark.parametrize(
+    "step_instance",
+    [
+        filters.HasMinLength(length=4),
+        filters.HasMaxLength(length=4),
+        filters.HasAllLetters(),
+        filters.HasAllLowerLettersNumbers(),
+        transform.ToLowercase(),
+        transform.SplitAndJoinN(split_by="-", join_by="_"),
+        transform.SplitAndJoinN(split_by="-", join_by="_", split_n=1),
+    ],
+)
+def test_vectorized(monkeypatch, step_instance) -> None:
+    """
+    Test that the numpy backend gives the same results as _run
+    """
+    pytest.importorskip("numpy")
+    from pipelib.steps import vectorized
+
+    items = ["", "one", "two-three-four", "Four", "five5", "ABC", "x y", "café"]
+    expected = [step_instance._run(x, **step_instance.kwargs) for x in items]
+
+    # By default, only arrays use the numpy backend
+    monkeypatch.setattr(vectorized, "threshold", 1)
+    assert not vectorized.enabled(items)
+    array = vectorized.as_array(items)
+    assert vectorized.enabled(array)
+    assert step_instance._run_batch(array, **step_instance.kwargs) == expected
+
+    monkeypatch.setattr(vectorized, "convert_lists", True)
+    assert vectorized.enabled(items)
+    assert step_instance._run_batch(items, **step_instance.kwargs) == expected
+    assert step_instance._run_batch(items[:-1], **step_instance.kwargs) == expected[:-1]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"unique_minor": True},
+        {"unique_major": True},
+        {"unique_major": True, "unique_minor": True, "ascending": True},
+        {"unique_patch": True, "unique_minor": True},
+        {"unique_patch": True, "unique_major": True, "ascending": True},
+    ],
+)
+def test_vectorized_tag_sort(monkeypatch, kwargs) -> None:
+    """
+    Test that the numpy tag sort gives the same results as the Python sort
+    """
+    pytest.importorskip("numpy")
+    items = ["latest", "", "v1.2.0-rc1", "1.2", "1.2.0", "99999999999999999999"]
+    items += generate_tags(1000, longest=5)
+
+    step = ContainerTagSort(**kwargs)
+    monkeypatch.setattr(vectorized, "sort_threshold", None)
+    expected = step.run(items)
+    monkeypatch.setattr(vectorized, "sort_threshold", 1)
+    assert step._select_vectorized([step.parse(x) for x in items]) is None
+    assert [id(x._original) for x in step.run(items[6:])] == [
+        id(x._original) for x in expected if str(x) != items[5]
+    ]
+
+
+@pytest.mark.parametrize("limit", [0, 1, 5, 50, 5000])
+def test_sort_limit(limit) -> None:
+    """
+    Test that sorting with a limit gives the latest limit of a full sort
+    """
+    items = ["latest", "v3", "v1.2.0-rc1", "1.2", "1.2.0", "1.2.3.4.5"]
+    items += generate_tags(1000, largest=6)
+
+    for kwargs in [{}, {"unique_minor": True}, {"unique_major": True}]:
+        for ascending in [False, True]:
+            for step_type in [ContainerTagSort, MajorTagSort]:
+                expected = step_type(ascending=False, **kwargs).run(items)[:limit]
+                if ascending:
+                    expected.reverse()
+                result = step_type(ascending=ascending, limit=limit, **kwargs).run(
+                    items
+                )
+                assert [id(x._original) for x in result] == [
+                    id(x._original) for x in expected
+                ]
+
+    for reverse in [False, True]:
+        expected = BasicSort(reverse=reverse).run(items)[:limit]
+        assert BasicSort(reverse=reverse, limit=limit).run(items) == expected
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"ascending": True}, {"limit": 3}])
+def test_tag_sort_granularities(kwargs) -> None:
+    """
+    Test that one sort for many granularities matches a run for each
+    """
+    items = ["latest", "1.2", "1.2.0", "v1.2.0-rc1"] + generate_tags(300)
+
+    views = ContainerTagSort(**kwargs).run_granularities(items)
+    assert list(views) == ["patch", "minor", "major"]
+    for granularity, view in views.items():
+        step = ContainerTagSort(**{"unique_" + granularity: True}, **kwargs)
+        assert [id(x._original) for x in view] == [
+            id(x._original) for x in step.run(items)
+        ]
+    assert list(ContainerTagSort().run_granularities(items, ["minor"])) == ["minor"]
+
+
+def test_sort_memory_limit() -> None:
+    """
+    Test that sorting with a memory limit gives the same as sorting in memory
+    """
+    items = ["latest", "1.2", "1.2.0", "v1.2.0-rc1"] + generate_tags(500)
+
+    for kwargs in [{}, {"unique_minor": True, "ascending": True}, {"limit": 3}]:
+        expected = ContainerTagSort(**kwargs).run(items)
+        step = ContainerTagSort(memory_limit=2000, **kwargs)
+        # Items read back from disk are copies, so we compare values
+        for result in [step.run(items), list(step.stream(iter(items)))]:
+            assert [(str(x), x._original) for x in result] == [
+                (str(x), x._original) for x in expected
+            ]
+
+    for reverse in [False, True]:
+        step = BasicSort(reverse=reverse, memory_limit=2000)
+        assert step.run(items) == BasicSort(reverse=reverse).run(items)
+        assert list(step.stream(iter(items))) == step.run(items)
+
+
+@pytest.mark.parametrize(
+    "constraint",
+    [">=1.2,<2.0", "~=3.4", "~=1.2.3", "==1.2.*", "!=1.2", "!=2.*,>0.5", "<=1.2", ">2"],
+)
+def test_version_range(constraint) -> None:
+    """
+    Test that a version range on sorted items matches checking each item
+    """
+    items = ["latest", "1.2", "1.2.0", "1.2.3", "v1.2", "2", "3.4"]
+    items += generate_tags(500)
+
+    step = VersionRange(constraint=constraint)
+    expected = [x for x in items if step._run(x, **step.kwargs)]
+    for ordered in ["ascending", "descending"]:
+        ordered_items = sorted(
+            [VersionWrapper(x) for x in items], reverse=ordered == "descending"
+        )
+        step = VersionRange(constraint=constraint, ordered=ordered)
+        assert sorted(map(str, step.run(ordered_items))) == sorted(expected)
+
+        # Unwrapped (and so unparsed) items are parsed when we look at them
+        unwrapped = [str(x) for x in ordered_items]
+        assert step.run(unwrapped) == [str(x) for x in step.run(ordered_items)]
+
+    with pytest.raises(SystemExit):
+        VersionRange(constraint=">=1.2.*")
+
+
+def test_composed_steps() -> None:
+    """
+    Test that composed steps short-circuit and keep their own kwargs
+    """
+    import pickle
+
+    items = ["a", "ab", "abc", "b", ""]
+
+    # Each step keeps its own length
+    between = filters.HasMinLength(length=2) & filters.HasMaxLength(length=2)
+    assert between.run(items) == ["ab"]
+    assert (~between).run(items) == ["a", "abc", "b", ""]
+    assert between.name == "HasMinLength_AND_HasMaxLength"
+
+    # The second check is not run once AND is False, or once OR is True
+    counted = Counted(letter="a")
+    composed = filters.HasMinLength(length=3) & counted
+    assert composed.run(items) == ["abc"]
+    assert counted.calls == ["abc"]
+    counted.calls.clear()
+    assert composed._run("ab") is False and not counted.calls
+
+    counted = Counted(letter="a")
+    composed = filters.HasMinLength(length=3) | ~counted
+    assert composed.run(items) == ["abc", "b", ""]
+    assert counted.calls == ["a", "ab", "b", ""]
+
+    # Three steps are flattened, and the result can be pickled
+    composed = between | filters.HasPatterns(filters=["c"]) | ~filters.HasAllLetters()
+    assert len(composed.steps) == 3
+    assert pickle.loads(pickle.dumps(composed)).run(items) == composed.run(items)
+
+
+def test_step_cache() -> None:
+    """
+    Test that a step with a cache only runs once for each unique item
+    """
+    import pickle
+
+    items = ["a", "b", "a", "ab", "b", "a"]
+    counted = Counted(letter="a", cache=3)
+    calls = counted.calls
+    assert counted.run(items) == ["a", "a", "ab", "a"]
+    assert calls == ["a", "b", "ab"]
+    assert counted.cache.hits == 3 and counted.cache.misses == 3
+
+    # The same cache is used for the reverse, and for a compiled check
+    calls.clear()
+    assert (~counted).run(["ab", "b"]) == ["b"]
+    assert counted.compile()("a") is True
+    assert calls == []
+
+    # The least recently used item ("ab") is evicted
+    assert counted.run(["c", "ab"]) == ["ab"]
+    assert calls == ["c", "ab"] and len(counted.cache) == 3
+
+    # Batched steps only run _run_batch for items not seen
+    patterns = filters.HasPatterns(filters=["x"], cache=100)
+    assert patterns.run(["ax", "b", "ax"]) == ["ax", "ax"]
+    assert patterns.cache.misses == 2 and patterns.cache.hits == 1
+    assert patterns.run(["ax", "b", "c"]) == ["ax"]
+    assert patterns.cache.misses == 3 and patterns.cache.hits == 3
+
+    # Every lookup is counted (under the lock) when threads share a cache
+    shared = filters.HasPatterns(filters=["x"], cache=100)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: shared.run(["ax", "b", "ax", "c"] * 50), range(16)))
+    assert shared.cache.hits + shared.cache.misses == 16 * 200
+
+    # A pickled step starts with an empty cache
+    copied = pickle.loads(pickle.dumps(patterns))
+    assert len(copied.cache) == 0 and copied.cache.maxsize == 100
+    assert copied.run(["ax", "b"]) == ["ax"]
+
+
+@pytest.mark.parametrize(
+    "patterns",
+    [
+        [],
+        ["dev"],
+        ["dev", "devel", "debug", "rc", "a.b"],
+        ["rc[0-9]+$", "^v", "x", "(?i:ALPHA)"],
+        ["(a)\\1", "(?P<n>b)(?P=n)", "c"],
+        ["(?i)beta", "(?P<n>x)", "(?P<n>y)"],
+        ["(q)x", "(a)?(?(1)b|c)"],
+        ["(?P<q>q)x", "(?P<a>a)?(?(a)b|c)"],
+        [re.compile("ALPHA", re.I), "xy", "a.b"],
+        ["a" * 1200, "a" * 1199 + "b", "dev"],
+        [""],
+    ],
+)
+def test_has_patterns(patterns) -> None:
+    """
+    Test that combined patterns give the same result as searching for each
+    """
+    from pipelib.steps.filters.strings import compile_patterns
+
+    items = ["dev1", "1.0-rc12", "v3", "aa", "bb", "", "BETA", "xy", "a-b", "alpha"]
+    items += ["ab", "ac", "a" * 1199 + "b", "a" * 1201]
+    expected = [bool(x) and any(re.search(p, x) for p in patterns) for x in items]
+    s = filters.HasPatterns(filters=patterns)
+    assert s._run_batch(items, **s.kwargs) == expected
+    assert [s._run(x, **s.kwargs) for x in items] == expected
+    assert len(compile_patterns(tuple(patterns))) <= 3
+
+    with pytest.raises(re.error):
+        filters.HasPatterns(filters=["dev", "rc("]).run(items)
+
+
+def test_item_batch() -> None:
+    """
+    Test that steps run on an ItemBatch and keep the index of the original
+    """
+    import pipelib.wrappers as wrappers
+    from pipelib.batch import ItemBatch
+
+    items = ["Item.1", "item.TWO", "3.0.0", "Item.10", "2.0.0"]
+    batch = ItemBatch.from_items(items)
+
+    # A filter marks rows, and doesn't copy the values
+    filtered = (~filters.HasPatterns(filters=["TWO"])).run_batch(batch)
+    assert filtered.values is items and list(filtered.mask) == [1, 0, 1, 1, 1]
+    assert len(filtered) == 4
+
+    # A transform replaces values, and keeps the index
+    lowered = transform.ToLowercase().run_batch(filtered)
+    assert lowered.values == ["item.1", "3.0.0", "item.10", "2.0.0"]
+    assert list(lowered.index) == [0, 2, 3, 4]
+    result = lowered.to_items()
+    originals = [wrappers.get_original(x) for x in result]
+    assert originals == ["Item.1", "3.0.0", "Item.10", "2.0.0"]
+    assert result[1] is items[2]
+
+    # Other steps are given (and return) a list of items
+    tags = ContainerTagSort(ascending=True).run_batch(lowered)
+    assert [str(x) for x in tags.values] == ["2.0.0", "3.0.0"]
+    assert list(tags.index) == [4, 2]
+    assert [str(x) for x in tags.to_items("none")] == ["2.0.0", "3.0.0"]
+
+    # New originals (e.g., from a step without provenance) don't change ours
+    unwrapped = ItemBatch.from_items(["4.0.0", items[0]], items)
+    assert unwrapped.originals == items + ["4.0.0"] and len(items) == 5
+    assert list(unwrapped.index) == [5, 0]
@@ -139,3 +139,97 @@ def test_print_json():
     print("Testing utils.print_json")
     result = utils.print_json({1: 1})
     assert result == '{\n    "1": 1\n}'
+
+
+@pytest.mark.parametrize("memory_limit", [None, 1, 500, 5000])
+def test_external_sort(tmp_path, memory_limit):
+    """
+    Test that sorting in runs on disk gives the same order as sorted
+    """
+    import random
+
+    import pipelib.wrappers as wrappers
+
+    random.seed(0)
+    items = [wrappers.Wrapper(str(random.randint(0, 50))) for _ in range(300)]
+    for reverse in [False, True]:
+        for key in [None, len]:
+            result = list(
+                utils.external_sort(
+                    items,
+                    key=key,
+                    reverse=reverse,
+                    memory_limit=memory_limit,
+                    tmpdir=str(tmp_path),
+                    fanin=3,
+                )
+            )
+            expected = sorted(items, key=key, reverse=reverse)
+            assert result == expected
+            assert [x._original for x in result] == [x._original for x in expected]
+
+    # The temporary runs are removed, even if we stop early
+    stream = utils.external_sort(items, memory_limit=memory_limit, tmpdir=str(tmp_path))
+    next(stream)
+    stream.close()
+    assert not os.listdir(str(tmp_path))
+
+
+@pytest.mark.parametrize("sink_type", ["TextSink", "JsonlSink", "CsvSink"])
+def test_sinks(tmp_path, sink_type):
+    """
+    Test writing streamed results (and originals) to a file atomically
+    """
+    import csv
+
+    import pipelib.pipeline as pipeline
+    import pipelib.steps as step
+
+    sink_type = getattr(utils, sink_type)
+    items = ["Item.ONE", "item-two", "Item, Three", 'quote"d']
+    p = pipeline.Pipeline(step.transform.ToLowercase())
+    expected = [
+        ("item.one", "Item.ONE"),
+        ("item-two", "item-two"),
+        ("item, three", "Item, Three"),
+        ('quote"d', 'quote"d'),
+    ]
+
+    def read(filename):
+        with open(filename, newline="") as fd:
+            if sink_type is utils.TextSink:
+                return [tuple(x.split("\t")) for x in fd.read().splitlines()]
+            if sink_type is utils.JsonlSink:
+                return [tuple(json.loads(x).values()) for x in fd]
+            return [tuple(x) for x in csv.reader(fd)][1:]
+
+    for original in [False, True]:
+        filename = str(tmp_path / "results" / ("results-%s" % original))
+        with sink_type(filename, original=original, buffer_size=3) as sink:
+            assert sink.write_all(p.stream(items, unwrap=False)) == 4
+
+            # Nothing is at the filename until we are done
+            assert not os.path.exists(filename)
+        assert read(filename) == [x if original else x[:1] for x in expected]
+
+    # An error leaves the last complete file (and no temporary file)
+    with pytest.raises(ValueError):
+        with sink_type(filename) as sink:
+            sink.write_all(items)
+            raise ValueError
+    assert sorted(os.listdir(str(tmp_path / "results"))) == [
+        "results-False",
+        "results-True",
+    ]
+    assert len(read(filename)) == 4
+
+    # Two sinks for the same filename don't share a temporary file
+    with sink_type(filename) as first, sink_type(filename) as second:
+        first.write_all(items[:1])
+        second.write_all(items)
+    assert len(read(filename)) == 1
+
+    # The file has the permissions of any other file we write
+    other = str(tmp_path / "other")
+    utils.write_file(other, "")
+    assert os.stat(filename).st_mode == os.stat(other).st_mode
@@ -1,3 +1,4 @@
+from pipelib.wrappers.base import Wrapper
 from pipelib.wrappers.version import VersionWrapper
 
 
@@ -18,3 +19,128 @@ def test_versionwrapper() -> None:
     assert major_minor < major_minor_patch
 
     assert hash(major_minor_patch_dup) == hash(major_minor_patch_dup)
+
+    # A version is equal to (and hashes like) its tag, and is ordered by
+    # version with other versions, and as a string with anything else
+    assert major_minor == "3.2" and hash(major_minor) == hash("3.2")
+    assert {major_minor: 1}["3.2"] == 1
+    assert VersionWrapper("v3.2") != major_minor and major_minor <= VersionWrapper(
+        "v3.2"
+    )
+    assert VersionWrapper("10") > major and VersionWrapper("10") < "3"
+    assert sorted([major, Wrapper("2"), "4"]) == ["2", "3", "4"]
+
+
+def test_parse_version(capsys) -> None:
+    """
+    Test that versions are parsed once into an immutable record
+    """
+    from pipelib.wrappers.version import parse_version
+
+    parsed = parse_version("1.2.3-alpha")
+    assert parsed.version == (1, 2, 3)
+    assert parsed.tags == {"-", "alpha"}
+    assert parsed.major_minor_patch == "1.2.3"
+    assert parse_version("v2").major == "2" and parse_version("v2").major_minor is None
+
+    # The same string gives the same record, and we don't print anything
+    first = VersionWrapper("1.2.3-alpha")
+    second = VersionWrapper("1.2.3-alpha")
+    assert first.parsed is second.parsed is parsed
+    assert first == second and first != VersionWrapper("1.2.4")
+    assert first.version == [1, 2, 3] and first.vstring == "1.2.3-alpha"
+    assert capsys.readouterr().out == ""
+
+
+def test_sort_versions() -> None:
+    """
+    Test that sorting by packed keys matches comparing versions
+    """
+    import random
+
+    from pipelib.wrappers.version import sort_versions
+
+    random.seed(1)
+    vstrings = ["1.2", "1.2.0", "v1.2.0-rc1", "latest", "0", "20220101", "1.10"]
+    vstrings += [
+        ".".join(str(random.randint(0, 12)) for _ in range(random.randint(1, 4)))
+        for _ in range(500)
+    ]
+    items = [VersionWrapper(x) for x in vstrings]
+    assert VersionWrapper("1.2").parsed.key < VersionWrapper("1.2.0").parsed.key
+
+    for reverse in [False, True]:
+        expected = sorted(items, reverse=reverse)
+        assert [id(x) for x in sort_versions(items, reverse)] == [
+            id(x) for x in expected
+        ]
+
+        # Versions that don't fit in a packed key are sorted by their tuple
+        unpacked = items + [VersionWrapper("1.2.3.4.5"), VersionWrapper("99999999999")]
+        assert VersionWrapper("1.2.3.4.5").parsed.key is None
+        expected = sorted(unpacked, reverse=reverse)
+        assert [id(x) for x in sort_versions(unpacked, reverse)] == [
+            id(x) for x in expected
+        ]
+
+
+def test_version_index(tmp_path) -> None:
+    """
+    Test that a version index answers the same as sorting all tags
+    """
+    import random
+
+    from pipelib.index import VersionIndex
+    from pipelib.steps.container.tags import ContainerTagSort
+
+    random.seed(2)
+
+    def generate():
+        parts = [str(random.randint(0, 5)) for _ in range(random.randint(1, 4))]
+        return random.choice(["", "v"]) + ".".join(parts)
+
+    tags = list(
+        dict.fromkeys(["latest", "1.2", "v1.2"] + [generate() for _ in range(300)])
+    )
+    index = VersionIndex(tags)
+    index.bucket_size = 8
+    for _ in range(300):
+        if random.random() < 0.5:
+            tag = generate()
+            assert index.add(tag) == (tag not in tags)
+            if tag not in tags:
+                tags.append(tag)
+        else:
+            tag = random.choice(tags)
+            assert index.remove(tag)
+            tags.remove(tag)
+    assert not index.remove("not-a-tag") and len(index) == len(tags)
+
+    def check(index):
+        versions = [VersionWrapper(x) for x in tags]
+        expected = sorted(versions, reverse=True)
+        assert [str(x) for x in index.versions(reverse=True)] == [
+            str(x) for x in expected
+        ]
+        for kwargs in [{}, {"unique_minor": True}, {"unique_major": True}]:
+            step = ContainerTagSort(**kwargs)
+            assert [str(x) for x in step.select(index.versions(reverse=True))] == [
+                str(x) for x in step.run(tags)
+            ]
+
+        # The latest for each major and minor, and those after 1.4
+        latest = [x for x in expected if x.major == "3"][0]
+        assert str(index.latest("3")) == str(latest) == str(index.latest_major["3"])
+        assert index.latest("9") is None
+        minors = {}
+        for version in expected:
+            minors.setdefault(version.major_minor, str(version))
+        minors.pop(None, None)
+        assert [str(x) for x in index.latest_per_minor()] == list(minors.values())
+        assert [str(x) for x in index.between("1.4", "3")] == [
+            str(x) for x in expected[::-1] if [1, 4] <= x.version < [3]
+        ]
+
+    check(index)
+    path = index.save(str(tmp_path / "index.json"))
+    check(VersionIndex.load(path))
@@ -1,5 +1,7 @@
+from .cache import LRUCache, freeze
 from .docs import get_docstring
 from .fileio import (
+    LineSource,
     copyfile,
     creation_date,
     get_file_hash,
@@ -13,9 +15,12 @@ from .fileio import (
     read_json,
     recursive_find,
     write_file,
+    write_file_atomic,
     write_json,
 )
 from .inspect import dynamic_import
+from .sinks import CsvSink, JsonlSink, Sink, TextSink
+from .sort import external_sort
 from .terminal import (
     check_install,
     confirm_action,
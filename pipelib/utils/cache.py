@@ -0,0 +1,95 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import collections
+import threading
+
+
+def freeze(obj):
+    """
+    Convert an object (e.g., step kwargs) into something hashable.
+    """
+    if isinstance(obj, dict):
+        return tuple(sorted((key, freeze(value)) for key, value in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(value) for value in obj)
+    if isinstance(obj, (set, frozenset)):
+        return frozenset(freeze(value) for value in obj)
+    return obj
+
+
+class LRUCache:
+    """
+    A bounded, thread-safe cache that evicts the least recently used entry.
+
+    Hits and misses are counted, and the cache can be shared across runs.
+    When pickled (e.g., to send to a worker) a new, empty cache is created.
+    """
+
+    missing = object()
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return "LRUCache(size=%s, maxsize=%s, hits=%s, misses=%s)" % (
+            len(self),
+            self.maxsize,
+            self.hits,
+            self.misses,
+        )
+
+    def __getstate__(self):
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state["maxsize"])
+
+    def get(self, key, default=missing):
+        """
+        Get a value from the cache, or the default (missing) if not found.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def hit(self):
+        """
+        Count a hit for a result we found another way (e.g., a key we are
+        already computing), under the lock like those counted by get.
+        """
+        with self._lock:
+            self.hits += 1
+
+    def set(self, key, value):
+        """
+        Add a value to the cache, evicting the oldest entry if we are full.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Empty the cache and reset the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
@@ -5,6 +5,7 @@ __license__ = "MPL 2.0"
 import errno
 import hashlib
 import json
+import mmap
 import os
 import re
 import shutil
@@ -152,6 +153,36 @@ def write_file(filename, content, mode="w", exec=False):
     return filename
 
 
+def write_file_atomic(filename, content):
+    """
+    Write content to a unique temporary file next to filename, and then move
+    it to filename, so readers (and other writers) never see a partial file.
+    """
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    fd, tmpfile = tempfile.mkstemp(prefix=basename + ".", suffix=".tmp", dir=dirname)
+    try:
+        with os.fdopen(fd, "w") as filey:
+            filey.write(content)
+
+        # mkstemp creates a private file, so give it the usual permissions
+        os.chmod(tmpfile, 0o666 & ~get_umask())
+        os.replace(tmpfile, filename)
+    except BaseException:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+    return filename
+
+
+def get_umask() -> int:
+    """
+    Get the umask of the process (it can only be read by setting it).
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
 def write_json(json_obj, filename, mode="w", print_pretty=True):
     """Write json to a filename"""
     with open(filename, mode) as filey:
@@ -177,3 +208,46 @@ def read_file(filename, mode="r"):
 def read_json(filename, mode="r"):
     """Read a json file to a dictionary."""
     return json.loads(read_file(filename))
+
+
+class LineSource:
+    """
+    Read the lines of a (large) text file without reading it all at once.
+
+    The file is memory mapped, and lines are decoded in chunks of about
+    chunk_size bytes. Iterating gives one line at a time (e.g., for a pipeline
+    stream) and chunks gives lists of lines. Newlines and empty lines are
+    not included.
+    """
+
+    def __init__(self, filename, chunk_size=2**22, encoding="utf-8"):
+        self.filename = filename
+        self.chunk_size = max(chunk_size, 1)
+        self.encoding = encoding
+
+    def __repr__(self):
+        return "LineSource(%s)" % self.filename
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
+
+    def chunks(self):
+        """
+        Yield lists of lines, each list from about chunk_size bytes.
+        """
+        with open(self.filename, "rb") as fd:
+            if not os.fstat(fd.fileno()).st_size:
+                return
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                start = 0
+                size = len(mapped)
+                while start < size:
+                    # A chunk ends after the first newline past chunk_size
+                    end = mapped.find(b"\n", min(start + self.chunk_size, size) - 1)
+                    end = size if end == -1 else end + 1
+                    text = mapped[start:end].decode(self.encoding)
+                    start = end
+                    if "\r" in text:
+                        text = text.replace("\r\n", "\n")
+                    yield [line for line in text.split("\n") if line]
@@ -2,7 +2,7 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
-import importlib
+import importlib.util
 import inspect
 import os
 import sys
@@ -58,7 +58,12 @@ def import_module(module_name, module_file):
     """
     Import a module (based on filename) into module name.
     """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
     module_spec = importlib.util.spec_from_file_location(module_name, module_file)
     module = importlib.util.module_from_spec(module_spec)
+
+    # Register the module so classes can be found again (e.g., to pickle)
+    sys.modules[module_name] = module
     module_spec.loader.exec_module(module)
     return module
@@ -0,0 +1,157 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import abc
+import csv
+import io
+import json
+import os
+import tempfile
+
+from .fileio import get_umask, mkdir_p
+
+
+class Sink:
+    """
+    Write results (e.g., from a pipeline stream) to a file, atomically.
+
+    Records are buffered and written buffer_size at a time to a temporary
+    file next to the filename, and the temporary file is renamed to the
+    filename when the sink is closed (or removed if we exit with an error).
+    With original=True, each record also has the original of the item.
+    """
+
+    def __init__(self, filename, original=False, buffer_size=10000, encoding="utf-8"):
+        self.filename = os.path.abspath(filename)
+        self.original = original
+        self.buffer_size = buffer_size
+        self.count = 0
+        self._records = []
+
+        # A unique temporary file, so sinks for the same filename don't collide
+        dirname, basename = os.path.split(self.filename)
+        mkdir_p(dirname)
+        fd, self._tmpfile = tempfile.mkstemp(prefix=basename + ".", dir=dirname)
+        self._fd = os.fdopen(fd, "w", encoding=encoding, newline="", buffering=2**20)
+        self._fd.write(self.header())
+
+    def __repr__(self) -> str:
+        return "%s(%s)" % (self.__class__.__name__, self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, item):
+        """
+        Add one item (a string or wrapper).
+        """
+        if self.original:
+            self._records.append((str(item), str(getattr(item, "_original", item))))
+        else:
+            self._records.append(str(item))
+        if len(self._records) >= self.buffer_size:
+            self.flush()
+
+    def write_all(self, items) -> int:
+        """
+        Add items from any iterable, and return the number written so far.
+        """
+        for item in items:
+            self.write(item)
+        return self.count + len(self._records)
+
+    def flush(self):
+        """
+        Write buffered records to the temporary file.
+        """
+        if self._records:
+            self._fd.write(self.format(self._records))
+            self.count += len(self._records)
+            self._records = []
+
+    def close(self) -> str:
+        """
+        Write what is left, and move the temporary file to the filename.
+        """
+        if self._fd.closed:
+            return self.filename
+        self.flush()
+        self._fd.close()
+
+        # mkstemp creates a private file, so give it the usual permissions
+        os.chmod(self._tmpfile, 0o666 & ~get_umask())
+        os.replace(self._tmpfile, self.filename)
+        return self.filename
+
+    def abort(self):
+        """
+        Stop writing, and remove the temporary file.
+        """
+        if not self._fd.closed:
+            self._fd.close()
+        if os.path.exists(self._tmpfile):
+            os.remove(self._tmpfile)
+
+    def header(self) -> str:
+        """
+        Content to write before any records.
+        """
+        return ""
+
+    @abc.abstractmethod
+    def format(self, records: list) -> str:
+        raise NotImplementedError("A sink must have a format function.")
+
+
+class TextSink(Sink):
+    """
+    Write one item per line (with original, the item and original by a tab).
+    """
+
+    def format(self, records: list) -> str:
+        if self.original:
+            records = ["%s\t%s" % record for record in records]
+        return "\n".join(records) + "\n"
+
+
+class JsonlSink(Sink):
+    """
+    Write one JSON object per line, with a value (and original).
+    """
+
+    def format(self, records: list) -> str:
+        # Only the strings need to be encoded
+        encode = json.dumps
+        if self.original:
+            lines = (
+                '{"value": %s, "original": %s}\n' % (encode(x), encode(o))
+                for x, o in records
+            )
+        else:
+            lines = ('{"value": %s}\n' % encode(x) for x in records)
+        return "".join(lines)
+
+
+class CsvSink(Sink):
+    """
+    Write a CSV with a value (and original) column.
+    """
+
+    def header(self) -> str:
+        return self.format([("value", "original") if self.original else "value"])
+
+    def format(self, records: list) -> str:
+        output = io.StringIO()
+        writer = csv.writer(output)
+        if self.original:
+            writer.writerows(records)
+        else:
+            writer.writerows([x] for x in records)
+        return output.getvalue()
@@ -0,0 +1,92 @@
+__author__ = "Vanessa Sochat"
+__copyright__ = "Copyright 2022, Vanessa Sochat"
+__license__ = "MPL 2.0"
+
+import heapq
+import itertools
+import os
+import pickle
+import shutil
+import sys
+
+from .fileio import get_tmpdir
+
+# Items are written to (and read from) a run in chunks of this many
+chunk_size = 1024
+
+
+def external_sort(
+    items, key=None, reverse=False, memory_limit=None, tmpdir=None, fanin=64
+):
+    """
+    Sort an iterable of items, keeping about memory_limit bytes of them in memory.
+
+    Sorted runs of items are saved (pickled) to a temporary directory, and then
+    merged (at most fanin at once) and yielded as a stream. The order is the
+    same as sorted(items, key=key, reverse=reverse), and if all items fit in
+    memory nothing is written.
+    """
+    workdir = None
+    runs = []
+    names = itertools.count()
+    run = []
+    size = 0
+    try:
+        for item in items:
+            run.append(item)
+            size += sys.getsizeof(item)
+            if memory_limit is not None and size >= memory_limit:
+                workdir = workdir or get_tmpdir(tmpdir, prefix="pipelib-sort")
+                run.sort(key=key, reverse=reverse)
+                runs.append(write_run(run, os.path.join(workdir, str(next(names)))))
+                run = []
+                size = 0
+
+        run.sort(key=key, reverse=reverse)
+        if not runs:
+            yield from run
+            return
+
+        # Merge the first runs into one until we can merge the rest at once
+        while len(runs) >= fanin:
+            merged = heapq.merge(
+                *(read_run(x) for x in runs[:fanin]), key=key, reverse=reverse
+            )
+            path = write_run(merged, os.path.join(workdir, str(next(names))))
+            for old in runs[:fanin]:
+                os.remove(old)
+            runs[:fanin] = [path]
+
+        # The last run is still in memory
+        yield from heapq.merge(
+            *(read_run(x) for x in runs), run, key=key, reverse=reverse
+        )
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def write_run(items, path) -> str:
+    """
+    Write an iterable of items to a file in chunks.
+    """
+    items = iter(items)
+    with open(path, "wb") as fd:
+        while True:
+            chunk = list(itertools.islice(items, chunk_size))
+            if not chunk:
+                return path
+            pickle.dump(chunk, fd, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_run(path):
+    """
+    Yield the items of a run written by write_run.
+    """
+    with open(path, "rb") as fd:
+        while True:
+            try:
+                chunk = pickle.load(fd)
+            except EOFError:
+                return
+            yield from chunk
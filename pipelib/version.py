@@ -2,7 +2,7 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
-__version__ = "0.0.17"
+__version__ = "0.0.42"
 AUTHOR = "Vanessa Sochat"
 EMAIL = "vsoch@users.noreply.github.com"
 NAME = "pipelib"
@@ -21,4 +21,6 @@ TESTS_REQUIRES = (("pytest", {"min_version": "4.6.2"}),)
 ################################################################################
 # Submodule Requirements
 
-INSTALL_REQUIRES_ALL = INSTALL_REQUIRES + TESTS_REQUIRES
+INSTALL_REQUIRES_NUMPY = (("numpy", {"min_version": None}),)
+
+INSTALL_REQUIRES_ALL = INSTALL_REQUIRES + INSTALL_REQUIRES_NUMPY + TESTS_REQUIRES
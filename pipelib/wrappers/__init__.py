@@ -1,2 +1,18 @@
-from .base import Wrapper, is_wrapped
-from .version import VersionWrapper
+from .base import (
+    HistoryWrapper,
+    Wrapper,
+    get_history,
+    get_original,
+    is_wrapped,
+    new_wrapper,
+    provenance,
+    provenance_modes,
+    wrap,
+)
+from .version import (
+    ParsedVersion,
+    VersionWrapper,
+    latest_versions,
+    parse_version,
+    sort_versions,
+)
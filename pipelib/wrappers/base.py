@@ -2,23 +2,103 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2021-2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
+import contextvars
+
+# How much we keep about where an item came from, set by a pipeline run:
+# none: items are plain strings
+# original: a transformed item keeps the original item (the default)
+# full: a transformed item keeps every value it has had
+provenance = contextvars.ContextVar("provenance", default="original")
+provenance_modes = ["none", "original", "full"]
+
 
 def is_wrapped(item):
     """
-    Determine if an item is wrapped based on finding the parent class
+    Determine if an item is wrapped
+    """
+    return isinstance(item, Wrapper)
+
+
+def get_original(item):
+    """
+    Get the original for an item (an item that isn't wrapped is its own).
+    """
+    return getattr(item, "_original", item)
+
+
+def wrap(updated, item):
+    """
+    Wrap an updated item (unless already wrapped) to keep the original item.
+    """
+    if not updated or isinstance(updated, Wrapper):
+        return updated
+
+    # An unchanged value keeps the item (and what we know about it) as is,
+    # unless it is a subclass (e.g., a VersionWrapper) that a transform would
+    # not return, as steps after it may compare it with the wrappers we make
+    unchanged = isinstance(item, str) and str.__eq__(updated, item) is True
+    if unchanged and type(item) in (str, Wrapper, HistoryWrapper):
+        return item
+
+    mode = provenance.get()
+    if mode == "none":
+        return str(updated)
+
+    # We could be handed a wrapped or unwrapped item
+    if mode == "full":
+        wrapped = new_wrapper(updated, get_original(item), HistoryWrapper)
+        wrapped._history = get_history(item)
+        if not unchanged:
+            wrapped._history += (str(updated),)
+        return wrapped
+    return new_wrapper(updated, get_original(item))
+
+
+def new_wrapper(value, original, cls=None):
+    """
+    Create a wrapper for a value with a known original (skipping __init__).
+    """
+    wrapped = str.__new__(cls or Wrapper, value)
+    wrapped._original = original
+    return wrapped
+
+
+def get_history(item) -> tuple:
+    """
+    Get the values an item has had, starting with the original.
     """
-    return Wrapper in item.__class__.__mro__
+    history = getattr(item, "_history", None)
+    if history is None:
+        original = get_original(item)
+        history = (str(original),)
+        if str(item) != history[0]:
+            history += (str(item),)
+    return history
 
 
 class Wrapper(str):
     """
     A base wrapper provides the same functionality as a string.
+
+    The original is kept in a slot (and not an instance dictionary) so a
+    wrapper costs little more than the string.
     """
 
+    __slots__ = ("_original",)
+
     def __init__(self, item=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # The wrapper always holds the original
-        if hasattr(item, "_original"):
-            self._original = item._original
-        else:
-            self._original = item
+        self._original = get_original(item)
+
+
+class HistoryWrapper(Wrapper):
+    """
+    A wrapper that also keeps every value an item has had (full provenance).
+    """
+
+    __slots__ = ("_history",)
+
+    def __init__(self, item=None, *args, **kwargs):
+        super().__init__(item, *args, **kwargs)
+        self._history = get_history(item)
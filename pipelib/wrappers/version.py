@@ -2,24 +2,117 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2021-2022, Vanessa Sochat"
 __license__ = "MPL 2.0"
 
+import functools
+import heapq
 import re
+import typing
 
-from packaging.version import Version
+from .base import Wrapper, get_original
 
-from .base import Wrapper
+# A version string is numbers (components), and anything else (tags) between
+# dots, e.g., 1.2.3-alpha has components [1, 2, 3] and tags {"-", "alpha"}
+component_re = re.compile(r"(\d+)|([a-z]+|[^\da-z.]+)")
+number_re = re.compile(r"\d+")
 
-# https://discuss.python.org/t/pep-632-deprecate-distutils-module/5134/129?page=7
+# A sort key packs up to this many components, each with this many bits
+key_components = 4
+key_bits = 32
 
 
-class LooseVersion(Version):
-    def __init__(self, vstring=None):
-        if vstring:
-            self.parse(vstring)
+class ParsedVersion(typing.NamedTuple):
+    """
+    An immutable, parsed version string.
+    """
+
+    vstring: str
+    version: tuple
+    major: typing.Optional[str]
+    major_minor: typing.Optional[str]
+    major_minor_patch: typing.Optional[str]
+
+    # An integer that sorts like the version (None if it doesn't fit)
+    key: typing.Optional[int]
+
+    @property
+    def tags(self) -> frozenset:
+        """
+        Non-numerical components (only found when asked for)
+        """
+        return frozenset(tag for _, tag in component_re.findall(self.vstring) if tag)
+
+
+@functools.lru_cache(maxsize=2**18)
+def parse_version(vstring: str) -> ParsedVersion:
+    """
+    Parse a version string (vstring) into numerical components.
+
+    Parsed versions are cached by the string, so each is only parsed once.
+    """
+    components = tuple(map(int, number_re.findall(vstring)))
 
-    component_re = re.compile(r"(\d+ | [a-z]+ | \.)", re.VERBOSE)
+    # Save parsed major.minor.patch in different lengths
+    # more strict considers duplicate of major "the same"
+    joined = [None, None, None]
+    for i in range(min(len(components), 3)):
+        joined[i] = ".".join(map(str, components[: i + 1]))
+    return ParsedVersion(vstring, components, *joined, pack_version(components))
 
 
-class VersionWrapper(Wrapper, LooseVersion):
+def pack_version(components: tuple) -> typing.Optional[int]:
+    """
+    Pack version components into one integer that sorts the same way.
+
+    Each component is stored as value + 1 (so a missing component is 0 and
+    1.2 sorts before 1.2.0) in a fixed number of bits.
+    """
+    if len(components) > key_components:
+        return
+    key = 0
+    for i in range(key_components):
+        value = components[i] + 1 if i < len(components) else 0
+        if value >> key_bits:
+            return
+        key = (key << key_bits) | value
+    return key
+
+
+def sort_versions(items: list, reverse=False, limit=None) -> list:
+    """
+    Sort a list of VersionWrapper by their packed keys.
+
+    If any version doesn't fit in a packed key (e.g., it has many components)
+    we sort by the tuple of components. Either way the order is the same as
+    comparing versions, and equal versions keep their order. Given a limit,
+    only the first limit versions are selected (with a heap) and returned.
+    """
+    keys = [x.parsed.key for x in items]
+    if None in keys:
+        keys = [x.parsed.version for x in items]
+    if limit is None:
+        order = sorted(range(len(items)), key=keys.__getitem__, reverse=reverse)
+    elif reverse:
+        order = heapq.nlargest(limit, range(len(items)), key=keys.__getitem__)
+    else:
+        order = heapq.nsmallest(limit, range(len(items)), key=keys.__getitem__)
+    return [items[i] for i in order]
+
+
+def latest_versions(items: list, select, limit: int) -> list:
+    """
+    Select (with a step select) the latest limit from a list of VersionWrapper.
+
+    Instead of sorting everything, we take the newest versions with a heap, and
+    take more (four times as many each time) until select keeps limit of them.
+    """
+    count = limit
+    while True:
+        filtered = select(sort_versions(items, reverse=True, limit=count))
+        if len(filtered) >= limit or count >= len(items):
+            return filtered
+        count *= 4
+
+
+class VersionWrapper(Wrapper):
     """
     Loose version comparison.
 
@@ -28,103 +121,65 @@ class VersionWrapper(Wrapper, LooseVersion):
     tags to derive a more meaningful version.
     """
 
-    @property
-    def major_minor(self):
-        if self._major_minor:
-            return ".".join(str(x) for x in self._major_minor)
-
-    @property
-    def major_minor_patch(self):
-        if self._major_minor_patch:
-            return ".".join(str(x) for x in self._major_minor_patch)
-
-    @property
-    def major(self):
-        if self._major:
-            return ".".join(str(x) for x in self._major)
+    __slots__ = ("parsed",)
 
     def __init__(self, item=None):
-        super().__init__(item)
-        self.tags = set()
-        self.version = []
-        if item:
-            self.parse(item)
+        self._original = get_original(item)
+        self.parsed = parse_version(str(item) if item else "")
 
     def parse(self, vstring):
         """
         Parse a version string (vstring) into pieces. Strings are added as tags.
         """
-        self.vstring = vstring
-        contenders = [x for x in self.component_re.split(vstring) if x and x != "."]
-        components = []
-
-        # Add non-numerical components as tags
-        for obj in contenders:
-            try:
-                components.append(int(obj))
-            except ValueError:
-                self.tags.add(obj)
-                pass
-
-        # Save parsed major.minor.patch in different lengths
-        self._major_minor_patch = None
-        self._major_minor = None
-        self._major = None
-
-        # more strict considers duplicate of major "the same"
-        if len(components) >= 1:
-            self._major = components[0:1]
-        if len(components) >= 2:
-            self._major_minor = components[0:2]
-        if len(components) >= 3:
-            self._major_minor_patch = components[0:3]
-        self.version = components
-        print(f"Setting version to {self.version}")
-
-    def __hash__(self) -> int:
-        return hash(tuple(self.version))
+        self.parsed = parse_version(vstring)
 
-    def __lt__(self, other) -> bool:
-        return self.version < other.version
-
-    def __le__(self, other) -> bool:
-        return self.version <= other.version
+    @property
+    def version(self) -> list:
+        return list(self.parsed.version)
 
-    def __eq__(self, other) -> bool:
-        return self.version == other.version
+    @property
+    def tags(self) -> frozenset:
+        return self.parsed.tags
 
-    def __ge__(self, other) -> bool:
-        return self.version >= other.version
+    @property
+    def vstring(self) -> str:
+        return str(self)
 
-    def __gt__(self, other) -> bool:
-        return self.version > other.version
+    @property
+    def major_minor(self):
+        return self.parsed.major_minor
 
-    def __ne__(self, other) -> bool:
-        return self.version != other.version
+    @property
+    def major_minor_patch(self):
+        return self.parsed.major_minor_patch
 
-    def _cmp(self, other):
-        """
-        This function is left for older versions of packaging.
-        """
-        if isinstance(other, str):
-            other = LooseVersion(other)
+    @property
+    def major(self):
+        return self.parsed.major
 
-        # We can only compare matching types
-        shortest = min(len(other.version), len(self.version))
+    # Equality (and so the hash) is that of the tag string, so a version is
+    # equal to its tag (as with any str), and versions are ordered by components.
+    # A comparison with anything else falls back to comparing strings.
+    __eq__ = str.__eq__
+    __ne__ = str.__ne__
+    __hash__ = str.__hash__
 
-        for i in range(shortest):
-            this_version = self.version[i]
-            other_version = other.version[i]
+    def __lt__(self, other) -> bool:
+        if not isinstance(other, VersionWrapper):
+            return NotImplemented
+        return self.parsed.version < other.parsed.version
 
-            if type(this_version) != type(other_version):
-                continue
+    def __le__(self, other) -> bool:
+        if not isinstance(other, VersionWrapper):
+            return NotImplemented
+        return self.parsed.version <= other.parsed.version
 
-            if this_version == other_version:
-                continue
-            elif this_version < other_version:
-                return -1
-            elif this_version > other_version:
-                return 1
+    def __ge__(self, other) -> bool:
+        if not isinstance(other, VersionWrapper):
+            return NotImplemented
+        return self.parsed.version >= other.parsed.version
 
-        # If we get to the bottom, consider equal
-        return 0
+    def __gt__(self, other) -> bool:
+        if not isinstance(other, VersionWrapper):
+            return NotImplemented
+        return self.parsed.version > other.parsed.version